@@ -0,0 +1,110 @@
+"""Compare parse time and peak memory of a full /enboxes listing.
+
+    $ python benchmarks/bench_parse.py --sizes 10000 100000
+    $ python benchmarks/bench_parse.py --sizes 100000 --iterations 5
+
+A mock gateway serves each size as one unpaginated response, which is fetched
+and parsed three ways:
+
+* json: the body read whole, then response.json() (the previous behaviour)
+* orjson: the body read whole, then orjson.loads(); only when orjson is installed
+* stream: MSPAPIClient.get_enboxes(), which parses the body chunk by chunk
+
+Times are medians of wall-clock fetch plus parse. Memory is traced with
+tracemalloc on a separate run: "peak" is the most allocated at once while
+fetching and parsing, and "kept" is what the parsed records still hold.
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_gateway import start_mock_gateway
+from msp_client import EnboxListCache, HTTPTransport, MSPAPIClient, RateLimiter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def parsers(client, transport, url):
+    """name -> fn() returning the parsed body"""
+    def full_json():
+        response = transport.request("GET", url)
+        response.raise_for_status()
+        return response.json()
+
+    def stream():
+        data, error = client.get_enboxes()
+        if error:
+            raise RuntimeError(error)
+        return data
+
+    modes = {"json": full_json}
+    if orjson is not None:
+        def full_orjson():
+            response = transport.request("GET", url)
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        modes["orjson"] = full_orjson
+    modes["stream"] = stream
+    return modes
+
+
+def measure(fn, iterations):
+    """(median ms, peak MB, kept MB, record count) for fn()"""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        data = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+        del data
+
+    gc.collect()
+    tracemalloc.start()
+    data = fn()
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(data["enboxes"])
+    del data
+    return statistics.median(timings), peak / 2**20, kept / 2**20, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=3, help="Timed runs per mode and size")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        server = start_mock_gateway(enbox_count=size, paginate=False, conditional=False)
+        transport = HTTPTransport()
+        client = MSPAPIClient(
+            f"bench-parse-{size}",
+            transport=transport,
+            enbox_cache=EnboxListCache(),
+            rate_limiter=RateLimiter(),
+            base_url=server.base_url,
+            email_base_url=server.base_url,
+        )
+        try:
+            body = transport.request("GET", f"{server.base_url}/enboxes")
+            print(f"{size} Enboxes ({len(body.content) / 2**20:.1f} MB body)")
+            del body
+            for name, fn in parsers(client, transport, f"{server.base_url}/enboxes").items():
+                median, peak, kept, count = measure(fn, args.iterations)
+                print(f"  {name:<8} median={median:8.1f}ms peak={peak:7.1f}MB kept={kept:7.1f}MB records={count}")
+        finally:
+            transport.close()
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
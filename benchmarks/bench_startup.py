@@ -0,0 +1,95 @@
+"""Measure cold start and per-rerun overhead of the Streamlit app.
+
+    $ python benchmarks/bench_startup.py --imports 5 --reruns 20
+
+Cold start is the time to import streamlit_app in a fresh interpreter, and
+whether that import pulled in pandas. Per-rerun overhead is the time for
+Streamlit's AppTest to rerun each page against a local mock gateway once the
+session is authenticated and the shared caches are warm.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_gateway import start_mock_gateway
+
+PAGES = ["Dashboard", "Create Enbox", "Send Email", "Manage Enbox", "Statistics", "Client Telemetry"]
+
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import streamlit_app
+print(time.perf_counter() - start, "pandas" in sys.modules)
+"""
+
+
+def bench_import(runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        timings.append(float(output[0]) * 1000)
+        pandas_loaded = output[1] == "True"
+
+    print(
+        f"import     runs={runs:<4} mean={statistics.mean(timings):.1f}ms "
+        f"min={min(timings):.1f}ms pandas_loaded={pandas_loaded}"
+    )
+
+
+def bench_reruns(reruns, enbox_count):
+    from streamlit.testing.v1 import AppTest
+
+    server = start_mock_gateway(enbox_count=enbox_count)
+    os.environ["MSP_BASE_URL"] = server.base_url
+    os.environ["MSP_EMAIL_BASE_URL"] = server.base_url
+    try:
+        at = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=60)
+        at.secrets["msp_api_key"] = "bench_key"
+        at.secrets["email_api_key"] = "bench_email_key"
+
+        start = time.perf_counter()
+        at.run()  # Authenticates, then reruns into the app
+        at.run()
+        print(f"first run  {(time.perf_counter() - start) * 1000:.1f}ms (authenticate + Dashboard)")
+
+        for page in PAGES:
+            at.sidebar.radio[0].set_value(page).run()  # Warm this page's caches
+            timings = []
+            for _ in range(reruns):
+                start = time.perf_counter()
+                at.run()
+                timings.append((time.perf_counter() - start) * 1000)
+            if at.exception:
+                raise RuntimeError(f"{page}: {at.exception}")
+
+            timings.sort()
+            print(
+                f"{page:<17} reruns={reruns:<4} mean={statistics.mean(timings):.1f}ms "
+                f"p50={timings[len(timings) // 2]:.1f}ms max={timings[-1]:.1f}ms"
+            )
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imports", type=int, default=5, help="Fresh interpreters to time the import in")
+    parser.add_argument("--reruns", type=int, default=20, help="Timed reruns per page")
+    parser.add_argument("--enboxes", type=int, default=1000, help="Enboxes served by the mock gateway")
+    args = parser.parse_args()
+
+    bench_import(args.imports)
+    bench_reruns(args.reruns, args.enboxes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Load-test MSPAPIClient and the page render path at several dataset sizes.
+
+    $ python benchmarks/bench_suite.py --sizes 100 10000 100000
+    $ python benchmarks/bench_suite.py --latency-ms 40 --error-rate 0.01
+    $ python benchmarks/bench_suite.py --save baseline.json
+    $ python benchmarks/bench_suite.py --compare baseline.json --tolerance 1.25
+
+For each size a mock gateway serves that many Enboxes, then the suite times:
+
+* client calls: list (full paginated fetch, and conditional/delta refresh of
+  a cached list), get, stats, usage, activate and send, plus concurrent get
+  throughput
+* render steps: parsing the list, building the table and search index, and
+  two searches
+* the Dashboard page itself, cold and warm, through Streamlit's AppTest
+
+--compare exits with status 1 if any mean is slower than the saved baseline
+by more than the tolerance factor (and by at least --min-delta-ms), so the
+suite can gate a deploy.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_gateway import start_mock_gateway
+from msp_client import (
+    EnboxCollection,
+    EnboxListCache,
+    HTTPTransport,
+    MSPAPIClient,
+    RateLimiter,
+    RetryPolicy,
+)
+
+
+def timed(fn, iterations):
+    """Call fn iterations times; return (timings in ms, errors)"""
+    timings = []
+    errors = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+        if isinstance(result, tuple) and len(result) == 2 and result[1]:
+            errors += 1
+    return timings, errors
+
+
+def report(results, size, name, timings, errors=0):
+    timings = sorted(timings)
+    mean = statistics.mean(timings)
+    results[f"{size}/{name}"] = mean
+    print(
+        f"  {name:<22} n={len(timings):<5} mean={mean:9.2f}ms "
+        f"p50={timings[len(timings) // 2]:9.2f}ms "
+        f"p95={timings[max(int(len(timings) * 0.95) - 1, 0)]:9.2f}ms "
+        f"ops/s={1000 / mean if mean else 0:9.1f} errors={errors}"
+    )
+
+
+def bench_client(results, size, server, args):
+    transport = HTTPTransport()
+    client = MSPAPIClient(
+        f"bench-{size}",
+        transport=transport,
+        enbox_cache=EnboxListCache(),
+        rate_limiter=RateLimiter(),
+        email_rate_limiter=RateLimiter(),
+        retry_policy=RetryPolicy(base_delay=0.05),
+        base_url=server.base_url,
+        email_base_url=server.base_url,
+    )
+    ids = [e["id"] for e in server.enboxes]
+    rng = random.Random(size)
+
+    def list_cold():
+        client.enbox_cache = EnboxListCache()
+        return client.list_enboxes()
+
+    report(results, size, "list_enboxes_full", *timed(list_cold, args.list_iterations))
+    report(results, size, "list_enboxes_sync", *timed(lambda: client.list_enboxes(force_refresh=True), args.iterations))
+    report(results, size, "get_enbox", *timed(lambda: client.get_enbox(rng.choice(ids)), args.iterations))
+    report(results, size, "get_stats", *timed(client.get_stats, args.iterations))
+    report(results, size, "get_usage", *timed(client.get_usage, args.iterations))
+    report(results, size, "activate_enbox", *timed(lambda: client.activate_enbox(rng.choice(ids)), args.iterations))
+    report(results, size, "send_email",
+           *timed(lambda: client.send_email("bench@example.com", "Bench", "Hello"), args.iterations))
+
+    # Throughput: many get_enbox calls in flight at once over the shared pool
+    calls = args.iterations * 4
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        outcomes = list(pool.map(lambda enbox_id: client.get_enbox(enbox_id), (rng.choice(ids) for _ in range(calls))))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for _, error in outcomes if error)
+    results[f"{size}/get_enbox_concurrent"] = elapsed * 1000 / calls
+    print(f"  {'get_enbox_concurrent':<22} n={calls:<5} workers={args.concurrency:<3} "
+          f"ops/s={calls / elapsed:9.1f} errors={errors}")
+
+    transport.close()
+    return client
+
+
+def bench_render(results, size, client, args):
+    payload, error = client.get_enboxes()
+    if error:
+        raise RuntimeError(error)
+    iterations = args.render_iterations
+
+    report(results, size, "parse_collection", *timed(lambda: EnboxCollection.from_response(payload), iterations))
+    report(results, size, "build_dataframe",
+           *timed(lambda: EnboxCollection.from_response(payload).dataframe, iterations))
+    report(results, size, "build_search_index",
+           *timed(lambda: EnboxCollection.from_response(payload).search_index, iterations))
+
+    index = EnboxCollection.from_response(payload).search_index
+    report(results, size, "search_selective", *timed(lambda: index.match("customer 99"), args.iterations))
+    report(results, size, "search_broad", *timed(lambda: index.match("via:direct customer"), args.iterations))
+
+
+def bench_page(results, size, server, args):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["MSP_BASE_URL"] = server.base_url
+    os.environ["MSP_EMAIL_BASE_URL"] = server.base_url
+    at = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=300)
+    at.secrets["msp_api_key"] = f"bench-page-{size}"
+    at.run()  # Authenticate
+
+    start = time.perf_counter()
+    at.run()  # Dashboard with a cold Enbox cache
+    cold = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception)
+    report(results, size, "dashboard_cold", [cold])
+
+    warm, _ = timed(at.run, args.render_iterations)
+    report(results, size, "dashboard_warm", warm)
+
+
+def compare(results, baseline_path, tolerance, min_delta):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, mean in sorted(results.items()):
+        before = baseline.get(name)
+        if before and mean > before * tolerance and mean - before > min_delta:
+            regressions.append(f"{name}: {before:.2f}ms -> {mean:.2f}ms ({mean / before:.2f}x)")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {tolerance}x:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {tolerance}x against {baseline_path}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per client operation and search")
+    parser.add_argument("--list-iterations", type=int, default=3, help="Full list fetches per size")
+    parser.add_argument("--render-iterations", type=int, default=3, help="Runs per render step")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers for the throughput run")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Mock gateway latency per response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Extra random mock latency, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of mock responses that are 5xx")
+    parser.add_argument("--skip-pages", action="store_true", help="Skip the AppTest page renders")
+    parser.add_argument("--save", help="Write mean timings to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file written by --save")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown factor for --compare")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        server = start_mock_gateway(
+            enbox_count=size,
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            error_rate=args.error_rate,
+            seed=size,
+        )
+        try:
+            print(f"{size} Enboxes")
+            client = bench_client(results, size, server, args)
+            bench_render(results, size, client, args)
+            if not args.skip_pages:
+                bench_page(results, size, server, args)
+        finally:
+            server.shutdown()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nSaved {len(results)} timings to {args.save}")
+    if args.compare:
+        sys.exit(compare(results, args.compare, args.tolerance, args.min_delta_ms))
+
+
+if __name__ == "__main__":
+    main()
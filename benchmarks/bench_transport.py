@@ -0,0 +1,70 @@
+"""Compare per-call connections against the pooled HTTPTransport.
+
+    $ python benchmarks/bench_transport.py --requests 200
+
+Both runs hit a local mock gateway, so the difference is the cost of opening a
+new TCP connection per call. Against the real gateway each avoided connection
+also saves a TLS handshake, so the savings there are larger.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from mock_gateway import start_mock_gateway
+from msp_client import HTTPTransport, MSPAPIClient
+
+
+class UnpooledTransport:
+    """Mimics the old behaviour: module-level requests calls, no reuse"""
+
+    def request(self, method, url, **kwargs):
+        return requests.request(method, url, **kwargs)
+
+
+def run(label, client, server, count):
+    server.connections = 0
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        _, error = client.get_stats()
+        timings.append((time.perf_counter() - start) * 1000)
+        if error:
+            raise RuntimeError(error)
+
+    timings.sort()
+    print(
+        f"{label:<10} requests={count:<6} connections={server.connections:<6} "
+        f"mean={statistics.mean(timings):.3f}ms "
+        f"p50={timings[len(timings) // 2]:.3f}ms "
+        f"p95={timings[int(len(timings) * 0.95) - 1]:.3f}ms"
+    )
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_mock_gateway()
+    try:
+        unpooled = MSPAPIClient("bench", transport=UnpooledTransport(), base_url=server.base_url)
+        pooled_transport = HTTPTransport()
+        pooled = MSPAPIClient("bench", transport=pooled_transport, base_url=server.base_url)
+
+        before = run("unpooled", unpooled, server, args.requests)
+        after = run("pooled", pooled, server, args.requests)
+        print(f"saved {before - after:.3f}ms per request ({(1 - after / before) * 100:.1f}%)")
+        pooled_transport.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""Local stand-in for the Supabase msp-gateway used by the benchmarks.
+
+Run standalone with:
+
+    $ python benchmarks/mock_gateway.py --port 8765 --enboxes 10000 --latency-ms 40 --error-rate 0.01
+
+then point MSPAPIClient at http://127.0.0.1:8765 via its base_url argument, or
+the app at it with MSP_BASE_URL and MSP_EMAIL_BASE_URL.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def make_enboxes(count):
+    """Build a deterministic list of fake Enbox records"""
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc).isoformat()
+    return [
+        {
+            "id": f"{i:08x}-0000-4000-8000-{i:012x}",
+            "enbox_rsync_id": f"rsync_{i:06d}",
+            "display_name": f"Customer {i}",
+            "created_via": "direct" if i % 3 else "invite",
+            "is_active": i % 7 != 0,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        for i in range(count)
+    ]
+
+
+class MockGatewayHandler(BaseHTTPRequestHandler):
+    """Serves the gateway routes used by MSPAPIClient"""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real gateway
+    disable_nagle_algorithm = True  # Headers and body are separate writes
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode() if status != 304 else b""
+        self.server.record_usage(self.command, self.path, status)
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.server.rate_limit is not None:
+            self.send_header("X-RateLimit-Limit", str(self.server.rate_limit))
+            self.send_header("X-RateLimit-Remaining", str(self.server.remaining()))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _rate_limited(self):
+        if self.server.take_request():
+            return False
+        self._send_json(429, {"error": "Rate limit exceeded"})
+        return True
+
+    def _simulate(self):
+        """Apply the configured latency and error rate; True if an error was sent"""
+        delay, status = self.server.simulate()
+        if delay:
+            time.sleep(delay)
+        if status is None:
+            return False
+        self._send_json(status, {"error": "Injected failure"})
+        return True
+
+    def do_GET(self):
+        if self._simulate() or self._rate_limited():
+            return
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        query = parse_qs(url.query)
+        enboxes = self.server.enboxes
+
+        if path.endswith("/enboxes"):
+            self._send_enbox_list(query)
+        elif "/enboxes/" in path:
+            enbox_id = path.rsplit("/", 1)[-1]
+            enbox = self.server.enboxes_by_id.get(enbox_id)
+            if enbox is None:
+                self._send_json(404, {"error": "Enbox not found"})
+            else:
+                self._send_json(200, {"enbox": enbox})
+        elif path.endswith("/stats"):
+            active = sum(1 for e in enboxes if e["is_active"])
+            self._send_json(200, {
+                "stats": {
+                    "total_enboxes": len(enboxes),
+                    "active_enboxes": active,
+                    "inactive_enboxes": len(enboxes) - active,
+                    "api_calls_24h": 0,
+                },
+                "rate_limit": {"remaining": self.server.remaining(), "reset_at": datetime.now(timezone.utc).isoformat()},
+            })
+        elif path.endswith("/usage"):
+            self._send_json(200, {"usage": self.server.usage()})
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _send_enbox_list(self, query):
+        server = self.server
+        with server._lock:
+            version, last_modified = server.version, server.last_modified
+            enboxes = list(server.enboxes)
+        validators = {}
+        if server.conditional:
+            validators = {"ETag": f'"v{version}"', "Last-Modified": formatdate(last_modified, usegmt=True)}
+            if self._not_modified(validators["ETag"], int(last_modified)):
+                self._send_json(304, None, validators)
+                return
+
+        since = query.get("updated_since", [None])[0]
+        if since and server.delta:
+            since = datetime.fromisoformat(since.replace("Z", "+00:00"))
+            changed = [e for e in enboxes if datetime.fromisoformat(e["updated_at"]) > since]
+            self._send_json(200, {"enboxes": changed, "count": len(enboxes), "delta": True, "deleted_ids": []},
+                            validators)
+            return
+
+        page = enboxes
+        if "limit" in query and server.paginate:
+            offset = int(query.get("offset", ["0"])[0])
+            page = enboxes[offset:offset + int(query["limit"][0])]
+        self._send_json(200, {"enboxes": page, "count": len(enboxes)}, validators)
+
+    def _not_modified(self, etag, last_modified):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= last_modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def do_POST(self):
+        payload = self._read_json()  # Always drain the body so the connection stays usable
+        if self._simulate() or self._rate_limited():
+            return
+        path = urlsplit(self.path).path.rstrip("/")
+
+        if path.endswith("/enboxes"):
+            if not payload.get("email"):
+                self._send_json(400, {"error": "email is required"})
+                return
+            self._send_json(201, self.server.create_enbox(payload))
+        elif path.endswith(("/activate", "/deactivate")):
+            enbox_id = path.rsplit("/", 2)[-2]
+            enbox = self.server.enboxes_by_id.get(enbox_id)
+            if enbox is None:
+                self._send_json(404, {"error": "Enbox not found"})
+                return
+            self.server.update_enbox(enbox, is_active=path.endswith("/activate"))
+            self._send_json(200, {"success": True, "enbox": enbox})
+        elif path.endswith("/emails"):
+            if not all(payload.get(k) for k in ("to", "subject", "body")):
+                self._send_json(400, {"error": "to, subject and body are required"})
+                return
+            self._send_json(200, {"success": True, "id": str(uuid.uuid4())})
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+
+class MockGatewayServer(ThreadingHTTPServer):
+    """Threaded mock gateway that counts accepted TCP connections"""
+
+    daemon_threads = True
+
+    def __init__(self, address, enbox_count=100, paginate=True, rate_limit=None,
+                 latency=0.0, jitter=0.0, error_rate=0.0, error_statuses=(500, 502, 503), seed=None,
+                 conditional=True, delta=True):
+        super().__init__(address, MockGatewayHandler)
+        self.paginate = paginate
+        self.conditional = conditional      # Send ETag/Last-Modified and answer 304
+        self.delta = delta                  # Honour updated_since on /enboxes
+        self.latency = latency              # Seconds added to every response
+        self.jitter = jitter                # Extra uniform random delay, in seconds
+        self.error_rate = error_rate        # Share of requests answered with an injected 5xx
+        self.error_statuses = error_statuses
+        self._random = random.Random(seed)
+        self.by_action = Counter()
+        self.by_status = Counter()
+        self.enboxes = make_enboxes(enbox_count)
+        self.enboxes_by_id = {e["id"]: e for e in self.enboxes}
+        self.connections = 0
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.version = 0                    # Bumped on every Enbox change; the list ETag
+        self.last_modified = time.time()
+        self._lock = threading.Lock()
+
+    def simulate(self):
+        """(delay in seconds, injected error status or None) for the next request"""
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self.error_rate and self._random.random() < self.error_rate
+            return delay, self._random.choice(self.error_statuses) if failed else None
+
+    def record_usage(self, method, path, status):
+        action = re.sub(r"/[0-9a-f-]{8,}(?=/|$)", "/{id}", urlsplit(path).path.rstrip("/"))
+        with self._lock:
+            self.by_action[f"{method} {action}"] += 1
+            self.by_status[str(status)] += 1
+
+    def usage(self):
+        with self._lock:
+            return {
+                "by_action": dict(self.by_action),
+                "by_status": dict(self.by_status),
+                "total_requests_24h": sum(self.by_status.values()),
+            }
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def take_request(self):
+        """Count a request; False once the rate limit budget is spent"""
+        with self._lock:
+            self.requests += 1
+            return self.rate_limit is None or self.requests <= self.rate_limit
+
+    def remaining(self):
+        if self.rate_limit is None:
+            return 1000
+        return max(self.rate_limit - self.requests, 0)
+
+    def _touch(self):
+        # Caller must hold self._lock
+        self.version += 1
+        self.last_modified = time.time()
+        return datetime.now(timezone.utc).isoformat()
+
+    def update_enbox(self, enbox, **changes):
+        with self._lock:
+            enbox.update(changes, updated_at=self._touch())
+
+    def create_enbox(self, payload):
+        with self._lock:
+            index = len(self.enboxes)
+            now = self._touch()
+            enbox = {
+                "id": str(uuid.uuid4()),
+                "enbox_rsync_id": f"rsync_{index:06d}",
+                "display_name": payload.get("display_name") or payload["email"],
+                "created_via": payload.get("create_via", "direct"),
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self.enboxes.append(enbox)
+            self.enboxes_by_id[enbox["id"]] = enbox
+        result = {"success": True, "enbox": enbox}
+        if enbox["created_via"] == "invite":
+            token = uuid.uuid4().hex
+            result.update({
+                "invite_token": token,
+                "invite_link": f"https://app.example.com/invite/{token}",
+                "invite_expires_at": datetime.now(timezone.utc).isoformat(),
+            })
+        return result
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_mock_gateway(host="127.0.0.1", port=0, **kwargs):
+    """Start a mock gateway on a background thread and return the server"""
+    server = MockGatewayServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock MSP gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--enboxes", type=int, default=100, help="Number of fake Enboxes to serve")
+    parser.add_argument("--no-pagination", action="store_true", help="Ignore limit/offset like an older gateway")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Answer 429 after this many requests")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Extra random delay, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of requests answered with a 5xx")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for jitter and error injection")
+    parser.add_argument("--no-conditional", action="store_true", help="Never send ETag/Last-Modified or 304")
+    parser.add_argument("--no-delta", action="store_true", help="Ignore updated_since like an older gateway")
+    args = parser.parse_args()
+
+    server = MockGatewayServer(
+        (args.host, args.port),
+        enbox_count=args.enboxes,
+        paginate=not args.no_pagination,
+        rate_limit=args.rate_limit,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        conditional=not args.no_conditional,
+        delta=not args.no_delta,
+    )
+    print(f"Mock gateway listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Client library for the MSP gateway, shared by the Streamlit app and the CLI.
+
+    from msp_client import MSPAPIClient
+
+    client = MSPAPIClient(api_key)
+    enboxes, error = client.list_enboxes()
+
+Run ``python -m msp_client --help`` for the command-line interface.
+"""
+from .bulk import (
+    bulk_create_enboxes,
+    bulk_set_enbox_status,
+    parse_bulk_upload,
+    run_rate_aware,
+)
+from .client import (
+    AsyncMSPAPIClient,
+    CircuitBreaker,
+    CircuitOpenError,
+    EnboxCollection,
+    EnboxListCache,
+    HTTPTransport,
+    MetricsRegistry,
+    MSPAPIClient,
+    RateLimiter,
+    RateLimitExceeded,
+    RetryPolicy,
+    configure_logging,
+    get_metrics,
+)
+from .streaming import JSONArrayStream, load_enbox_response
+
+__all__ = [
+    "AsyncMSPAPIClient",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "EnboxCollection",
+    "EnboxListCache",
+    "HTTPTransport",
+    "JSONArrayStream",
+    "MetricsRegistry",
+    "MSPAPIClient",
+    "RateLimiter",
+    "RateLimitExceeded",
+    "RetryPolicy",
+    "bulk_create_enboxes",
+    "bulk_set_enbox_status",
+    "configure_logging",
+    "get_metrics",
+    "load_enbox_response",
+    "parse_bulk_upload",
+    "run_rate_aware",
+]
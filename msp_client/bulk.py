@@ -0,0 +1,211 @@
+"""Concurrent, rate-aware bulk operations on top of MSPAPIClient"""
+import csv
+import io
+import json
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .client import CIRCUIT_OPEN_ERROR, RATE_LIMIT_ERROR
+
+# Bulk operation configuration
+BULK_MAX_WORKERS = 8            # Default concurrent requests for bulk jobs
+RATE_LIMIT_RESERVE = 10         # Requests bulk jobs leave free for interactive use
+BULK_RETRY_BACKOFF = 0.5        # Seconds before a campaign retries failed messages
+
+_HTTP_ERROR_STATUS = re.compile(r"\b(\d{3}) (?:Client|Server) Error")
+
+def invite_details(result):
+    """Return (invite_path, invite_token) from a create_enbox response"""
+    invite_link = result.get('invite_link', '')
+    invite_token = result.get('invite_token', 'N/A')
+    
+    # Extract just the path if full URL is provided
+    if invite_link and '/invite/' in invite_link:
+        invite_path = '/invite/' + invite_link.split('/invite/')[-1]
+    else:
+        invite_path = f'/invite/{invite_token}' if invite_token != 'N/A' else 'N/A'
+    return invite_path, invite_token
+
+def parse_bulk_upload(filename, text):
+    """
+    Parse a CSV or JSONL upload of Enboxes to create. Returns (rows, error); each
+    row has email, display_name, create_via and password keys. create_via
+    defaults to "direct" when a password is given and "invite" otherwise.
+    """
+    try:
+        if filename.lower().endswith((".jsonl", ".ndjson")):
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            records = list(csv.DictReader(io.StringIO(text)))
+    except (json.JSONDecodeError, csv.Error) as e:
+        return None, f"Could not parse {filename}: {e}"
+    
+    if not all(isinstance(record, dict) for record in records):
+        return None, f"Could not parse {filename}: every line must be a JSON object"
+    return [bulk_row(record) for record in records], None
+
+def bulk_row(record):
+    """Normalize one uploaded record to the email, display_name, create_via and password keys"""
+    record = {str(k).strip().lower(): str(v).strip() if v is not None else "" for k, v in record.items() if k}
+    password = record.get("password", "")
+    return {
+        "email": record.get("email", ""),
+        "display_name": record.get("display_name", ""),
+        "create_via": record.get("create_via") or ("direct" if password else "invite"),
+        "password": password,
+    }
+
+def validate_bulk_row(row):
+    """Apply the single-create form's validation to one bulk row; returns an error or None"""
+    if not row["email"]:
+        return "Email is required"
+    if "@" not in row["email"]:
+        return "Invalid email address"
+    if row["create_via"] not in ("direct", "invite"):
+        return f"Unknown create_via '{row['create_via']}'"
+    if row["create_via"] == "direct" and len(row["password"]) < 6:
+        return "Password of at least 6 characters is required for direct creation"
+    return None
+
+def rate_limit_budget(client):
+    """Requests a bulk job may spend now, from the gateway's rate_limit.remaining (None if unknown)"""
+    stats_data, error = client.get_stats()
+    if error:
+        return None
+    remaining = stats_data.get('rate_limit', {}).get('remaining')
+    if remaining is None:
+        return None
+    return max(int(remaining) - RATE_LIMIT_RESERVE, 0)
+
+def _bulk_create_result(index, row, status, result=None, error=None):
+    invite_path, invite_token = invite_details(result) if result and row["create_via"] == "invite" else ("", "")
+    enbox = result.get('enbox', result) if result else {}
+    return {
+        "row": index,
+        "email": row["email"],
+        "create_via": row["create_via"],
+        "status": status,
+        "enbox_id": enbox.get("id", "") if isinstance(enbox, dict) else "",
+        "invite_path": invite_path,
+        "invite_token": invite_token,
+        "error": error or "",
+    }
+
+def error_status(error):
+    """HTTP status code of a requests HTTPError message ("404 Client Error: ..."), or None"""
+    match = _HTTP_ERROR_STATUS.search(error)
+    return match.group(1) if match else None
+
+def run_rate_aware(fn, items, max_workers=BULK_MAX_WORKERS, budget=None):
+    """
+    Call fn(item) on a bounded thread pool, yielding (item, outcome, skip_reason)
+    as calls complete. fn returns a tuple whose second element is an error string
+    or None. At most `budget` calls are made and no new call starts after the
+    gateway answers 429; items never sent are yielded with outcome None.
+    """
+    pending = iter(items)
+    in_flight = {}
+    stop_reason = None
+    sent = 0
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk") as executor:
+        while True:
+            # Keep at most max_workers requests in flight so a 429 stops new sends quickly
+            while stop_reason is None and len(in_flight) < max_workers:
+                if budget is not None and sent >= budget:
+                    stop_reason = "Skipped: rate limit budget exhausted"
+                    break
+                try:
+                    item = next(pending)
+                except StopIteration:
+                    break
+                sent += 1
+                in_flight[executor.submit(fn, item)] = item
+            
+            if not in_flight:
+                break
+            
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                outcome = future.result()
+                error = outcome[1]
+                if error and (error_status(error) == "429" or error.startswith((RATE_LIMIT_ERROR, CIRCUIT_OPEN_ERROR))):
+                    stop_reason = "Skipped: gateway rate limit reached"
+                yield item, outcome, None
+    
+    for item in pending:
+        yield item, None, stop_reason
+
+def bulk_create_enboxes(client, rows, max_workers=BULK_MAX_WORKERS, budget=None):
+    """
+    Create Enboxes concurrently, yielding one result dict per row as it completes.
+    Invalid rows are reported without being sent; see run_rate_aware for how the
+    rate limit budget and 429s are handled.
+    """
+    valid = []
+    for index, row in enumerate(rows, start=1):
+        error = validate_bulk_row(row)
+        if error:
+            yield _bulk_create_result(index, row, "invalid", error=error)
+        else:
+            valid.append((index, row))
+    
+    def create(item):
+        _, row = item
+        return client.create_enbox(
+            email=row["email"],
+            password=row["password"] or None,
+            display_name=row["display_name"] or None,
+            create_via=row["create_via"]
+        )
+    
+    for (index, row), outcome, skip_reason in run_rate_aware(create, valid, max_workers, budget):
+        if outcome is None:
+            yield _bulk_create_result(index, row, "skipped", error=skip_reason)
+        else:
+            result, error = outcome
+            yield _bulk_create_result(index, row, "failed" if error else "created", result, error)
+
+def is_transient_error(error):
+    """Whether a client error string is worth retrying: network errors, 408, 429 and 5xx"""
+    if error.startswith("Authentication failed"):
+        return False
+    status = error_status(error)
+    return not (status and status.startswith("4") and status not in ("408", "429"))
+
+def bulk_set_enbox_status(client, enbox_ids, activate, max_workers=BULK_MAX_WORKERS, budget=None,
+                          skip_unchanged=False):
+    """
+    Activate or deactivate Enboxes concurrently, yielding one result dict per id.
+    
+    Every id is sent, and the client's retry policy retries transient
+    failures. With skip_unchanged, ids that a fresh cached list already shows
+    in the target state are reported as "unchanged" without a call. The
+    cached list is patched once, after all calls finish.
+    """
+    cached = client.enbox_cache.get(client.api_key) if skip_unchanged else None  # None once past its TTL
+    action = client.activate_enbox if activate else client.deactivate_enbox
+    
+    to_send = []
+    for enbox_id in enbox_ids:
+        enbox = cached.get(enbox_id) if cached else None
+        if enbox is not None and enbox.get("is_active", True) == activate:
+            yield {"enbox_id": enbox_id, "status": "unchanged", "error": ""}
+        else:
+            to_send.append(enbox_id)
+    
+    changed = {}
+    for enbox_id, outcome, skip_reason in run_rate_aware(
+        lambda enbox_id: action(enbox_id, update_cache=False), to_send, max_workers, budget
+    ):
+        if outcome is None:
+            yield {"enbox_id": enbox_id, "status": "skipped", "error": skip_reason}
+            continue
+        _, error = outcome
+        if error is None:
+            changed[enbox_id] = {"is_active": activate}
+        yield {"enbox_id": enbox_id, "status": "failed" if error else "updated", "error": error or ""}
+    
+    if changed:
+        client.enbox_cache.patch_many(client.api_key, changed)
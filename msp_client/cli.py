@@ -0,0 +1,265 @@
+"""
+Run MSP gateway operations from the command line, without the Streamlit UI.
+
+    $ export MSP_API_KEY=msp_...
+    $ python -m msp_client list > enboxes.jsonl
+    $ python -m msp_client get 0000002a-0000-4000-8000-00000000002a
+    $ jq -c 'select(.is_active) | {id}' enboxes.jsonl | python -m msp_client deactivate -c 16
+    $ python -m msp_client create --input new_enboxes.jsonl --output created.jsonl
+    $ python -m msp_client send --to rsync_000042 --subject Hello --body "Hi there"
+    $ python -m msp_client stats
+
+get, activate, deactivate, create and send take their items from the
+command line or, when none are given, as JSON lines from --input or stdin.
+Each line is an object ({"id": ...}, a create row, or {"to", "subject",
+"body"}), or a bare Enbox id. Items are processed concurrently over one pooled
+connection set, and one JSON line is written per item as it completes:
+
+    {"input": ..., "result": ..., "error": null}
+
+A summary goes to stderr. The exit status is 1 if any item failed or was
+skipped, so the command can gate a cron job or pipeline step.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+from .bulk import BULK_MAX_WORKERS, bulk_row, run_rate_aware, validate_bulk_row
+from .client import (
+    BASE_URL,
+    EMAIL_BASE_URL,
+    ENBOX_PAGE_SIZE,
+    LOG_LEVEL,
+    POOL_MAXSIZE,
+    EnboxListCache,
+    HTTPTransport,
+    MSPAPIClient,
+    configure_logging,
+    get_metrics,
+    redact,
+)
+
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def read_items(path=None, values=None):
+    """Items from command-line values, or parsed JSON lines from path or stdin, read lazily"""
+    if values and values != ["-"]:
+        yield from values
+        return
+    
+    stream = sys.stdin if path in (None, "-") else open(path)
+    with contextlib.closing(stream) if stream is not sys.stdin else contextlib.nullcontext(stream):
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line) if line.startswith("{") else line
+            except json.JSONDecodeError:
+                yield line  # Reported as an invalid item rather than aborting the run
+
+def enbox_id(item):
+    if isinstance(item, dict):
+        return item.get("id") or item.get("enbox_id")
+    return item
+
+def write_line(output, record):
+    output.write(json.dumps(record, default=str) + "\n")
+    output.flush()
+
+def open_output(path):
+    if path in (None, "-"):
+        return contextlib.nullcontext(sys.stdout)
+    return open(path, "w")
+
+def build_client(args):
+    api_key = args.api_key or os.environ.get("MSP_API_KEY")
+    if not api_key:
+        raise SystemExit("msp_client: an API key is required (--api-key or MSP_API_KEY)")
+    
+    # Pools block when exhausted, so size them for every worker
+    concurrency = getattr(args, "concurrency", 1)
+    transport = HTTPTransport(pool_maxsize=max(concurrency, POOL_MAXSIZE))
+    return MSPAPIClient(
+        api_key,
+        args.email_api_key or os.environ.get("MSP_EMAIL_API_KEY"),
+        transport=transport,
+        enbox_cache=EnboxListCache(),  # Private: the CLI never writes the app's snapshots
+        base_url=args.base_url,
+        email_base_url=args.email_base_url,
+    )
+
+def item_operation(client, command):
+    """fn(item) -> (result, error) for one item of a batch command"""
+    if command in ("get", "activate", "deactivate"):
+        action = {
+            "get": client.get_enbox,
+            "activate": lambda i: client.activate_enbox(i, update_cache=False),
+            "deactivate": lambda i: client.deactivate_enbox(i, update_cache=False),
+        }[command]
+        
+        def by_id(item):
+            target = enbox_id(item)
+            if not target or not isinstance(target, str):
+                return None, "Expected an Enbox id or an object with an id"
+            return action(target)
+        return by_id
+    
+    if command == "create":
+        def create(item):
+            if not isinstance(item, dict):
+                return None, "Expected a JSON object"
+            row = bulk_row(item)
+            error = validate_bulk_row(row)
+            if error:
+                return None, error
+            return client.create_enbox(
+                email=row["email"],
+                password=row["password"] or None,
+                display_name=row["display_name"] or None,
+                create_via=row["create_via"]
+            )
+        return create
+    
+    def send(item):
+        if not isinstance(item, dict) or not all(item.get(k) for k in ("to", "subject", "body")):
+            return None, "Expected an object with to, subject and body"
+        return client.send_email(item["to"], item["subject"], item["body"])
+    return send
+
+def run_batch(client, args):
+    if args.command == "create" and args.email:
+        items = iter([{
+            "email": args.email,
+            "password": args.password or "",
+            "display_name": args.display_name or "",
+            "create_via": args.create_via or "",
+        }])
+    elif args.command == "send" and args.to:
+        items = iter([{"to": args.to, "subject": args.subject, "body": args.body}])
+    else:
+        items = read_items(args.input, getattr(args, "ids", None))
+    
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+    with open_output(args.output) as output:
+        operation = item_operation(client, args.command)
+        for item, outcome, skip_reason in run_rate_aware(operation, items, args.concurrency):
+            if outcome is None:
+                counts["skipped"] += 1
+                result, error = None, skip_reason
+            else:
+                result, error = outcome
+                counts["failed" if error else "ok"] += 1
+            write_line(output, {"input": redact(item), "result": result, "error": error})
+    
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(
+        f"{args.command}: {counts['ok']} ok, {counts['failed']} failed, {counts['skipped']} skipped "
+        f"in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s)",
+        file=sys.stderr
+    )
+    return 1 if counts["failed"] or counts["skipped"] else 0
+
+def run_list(client, args):
+    with open_output(args.output) as output:
+        for page, error in client.iter_enbox_pages(args.page_size):
+            if error:
+                print(json.dumps({"error": error}), file=sys.stderr)
+                return 1
+            for enbox in page["enboxes"]:
+                write_line(output, enbox)
+    return 0
+
+def run_single(client, args):
+    result, error = client.get_stats() if args.command == "stats" else client.get_usage()
+    if error:
+        print(json.dumps({"error": error}), file=sys.stderr)
+        return 1
+    with open_output(args.output) as output:
+        write_line(output, result)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m msp_client", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--api-key", help="MSP API key (default: $MSP_API_KEY)")
+    parser.add_argument("--email-api-key", help="Email API key for send (default: $MSP_EMAIL_API_KEY, else the MSP key)")
+    parser.add_argument("--base-url", default=BASE_URL, help="MSP gateway URL (default: $MSP_BASE_URL or production)")
+    parser.add_argument("--email-base-url", default=EMAIL_BASE_URL, help="Email gateway URL")
+    parser.add_argument("--log-level", default=LOG_LEVEL, type=str.upper, choices=LOG_LEVELS,
+                        help="Level of the JSON logs written to stderr")
+    parser.add_argument("--metrics-file", help="Write Prometheus metrics for the run to this file on exit")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+    
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--output", "-o", help="Write JSON lines here instead of stdout")
+    batch = argparse.ArgumentParser(add_help=False, parents=[output])
+    batch.add_argument("--input", "-i", help="Read items as JSON lines from this file ('-' for stdin, the default)")
+    batch.add_argument("--concurrency", "-c", type=positive_int, default=BULK_MAX_WORKERS, help="Requests in flight at once")
+    
+    listing = commands.add_parser("list", parents=[output], help="Stream every Enbox as a JSON line")
+    listing.add_argument("--page-size", type=positive_int, default=ENBOX_PAGE_SIZE)
+    for name, help_text in (
+        ("get", "Fetch Enboxes by id"),
+        ("activate", "Activate Enboxes by id"),
+        ("deactivate", "Deactivate Enboxes by id"),
+    ):
+        command = commands.add_parser(name, parents=[batch], help=help_text)
+        command.add_argument("ids", nargs="*", help="Enbox ids; none or '-' reads JSON lines")
+    
+    create = commands.add_parser(
+        "create", parents=[batch],
+        help="Create Enboxes from JSON lines with email, password, display_name and create_via"
+    )
+    create.add_argument("--email", help="Create one Enbox from these flags instead of reading lines")
+    create.add_argument("--password")
+    create.add_argument("--display-name")
+    create.add_argument("--create-via", choices=["direct", "invite"])
+    
+    send = commands.add_parser("send", parents=[batch], help="Send emails from JSON lines with to, subject and body")
+    send.add_argument("--to", help="Send one email from these flags instead of reading lines")
+    send.add_argument("--subject")
+    send.add_argument("--body")
+    
+    commands.add_parser("stats", parents=[output], help="Print /stats as one JSON line")
+    commands.add_parser("usage", parents=[output], help="Print /usage as one JSON line")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "send" and args.to and not (args.subject and args.body):
+        parser.error("send --to also needs --subject and --body")
+    
+    configure_logging(args.log_level)
+    client = build_client(args)
+    try:
+        if args.command == "list":
+            return run_list(client, args)
+        if args.command in ("stats", "usage"):
+            return run_single(client, args)
+        return run_batch(client, args)
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); silence the flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        client.transport.close()
+        if args.metrics_file:
+            get_metrics().dump(args.metrics_file)
@@ -0,0 +1,1930 @@
+"""
+Gateway client for the MSP API: pooled transports, rate limiting, retries,
+circuit breaking, metrics, and the shared Enbox list cache.
+
+Process-wide resources (transport, caches, limiters, metrics) are created
+once on first use by the get_* functions and shared by every client.
+"""
+import asyncio
+import atexit
+import bisect
+import contextlib
+import copy
+import functools
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import shlex
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from .streaming import load_enbox_response
+
+def env_number(name, default, cast=float):
+    """A numeric setting from the environment; a missing or malformed value falls back to default"""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        # Logging may not be configured yet, so keep the message readable on its own
+        logging.getLogger("msp").warning("config.invalid: %s=%r is not a number; using %s", name, value, default)
+        return default
+
+def log_level_name(value, source="MSP_LOG_LEVEL"):
+    """A logging level name for value; anything else falls back to WARNING"""
+    level = str(value).strip().upper()
+    if level in logging.getLevelNamesMapping():
+        return level
+    logging.getLogger("msp").warning("config.invalid: %s=%r is not a log level; using WARNING", source, value)
+    return "WARNING"
+
+# API Configuration
+BASE_URL = os.environ.get("MSP_BASE_URL", "https://vwhxcuylitpawxjplfnq.supabase.co/functions/v1/msp-gateway")
+EMAIL_BASE_URL = os.environ.get("MSP_EMAIL_BASE_URL", "https://vwhxcuylitpawxjplfnq.supabase.co/functions/v1/api-gateway")
+
+# HTTP transport configuration
+POOL_CONNECTIONS = 4        # Number of per-host connection pools kept alive
+POOL_MAXSIZE = 16           # Keep-alive connections per host
+DEFAULT_TIMEOUT = (5, 30)   # (connect, read) timeout in seconds
+
+# Logging
+LOG_LEVEL = log_level_name(os.environ.get("MSP_LOG_LEVEL", "WARNING"))
+LOG_TRACE_SAMPLE_RATE = env_number("MSP_LOG_TRACE_SAMPLE", 0.0)  # Share of DEBUG responses logged with headers and body
+LOG_QUEUE_SIZE = 10000      # Records buffered for the writer thread; further records are dropped
+SECRET_FIELDS = frozenset({
+    "x-msp-api-key", "x-api-key", "authorization", "cookie", "set-cookie",
+    "password", "api_key", "email_api_key",
+})
+SECRET_PATTERN = re.compile(
+    r"((?:x-(?:msp-)?api-key|authorization|password|api_key)['\"]?\s*[:=]\s*['\"]?(?:bearer\s+)?)([^'\"\s,}]+)",
+    re.IGNORECASE
+)
+
+logger = logging.getLogger("msp")
+
+def redact(value):
+    """Copy of a log value with secrets masked, recursing into dicts and lists"""
+    if isinstance(value, dict):
+        return {k: "[REDACTED]" if str(k).lower() in SECRET_FIELDS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    if isinstance(value, str):
+        return SECRET_PATTERN.sub(r"\1[REDACTED]", value)
+    return value
+
+class RedactingFilter(logging.Filter):
+    """Masks secrets in a record's message, args and structured fields"""
+    
+    def filter(self, record):
+        record.msg = redact(record.msg)
+        if record.args:
+            record.args = redact(record.args)
+        if getattr(record, "fields", None):
+            record.fields = redact(record.fields)
+        return True
+
+class JSONLogFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, event and its fields"""
+    
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind"""
+    
+    dropped = 0
+    
+    def prepare(self, record):
+        """
+        Merge args into the message and move any traceback into an "exc"
+        field, redacting both. QueueHandler.prepare would format the traceback
+        into the message after RedactingFilter has already run.
+        """
+        record = copy.copy(record)
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info or record.stack_info:
+            formatter = logging.Formatter()
+            if record.exc_info:
+                trace = formatter.formatException(record.exc_info)
+            else:
+                trace = formatter.formatStack(record.stack_info)
+            record.fields = {**(getattr(record, "fields", None) or {}), "exc": redact(trace)}
+        record.exc_info = record.exc_text = record.stack_info = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+@functools.lru_cache(maxsize=None)
+def configure_logging(level=LOG_LEVEL):
+    """
+    Send the msp logger through a bounded queue to a writer thread; runs once per process.
+    
+    Callers only pay for the level check, redaction and an enqueue; JSON
+    formatting and the stderr write happen on the listener thread.
+    """
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(records)
+    handler.addFilter(RedactingFilter())
+    stream = logging.StreamHandler()
+    stream.setFormatter(JSONLogFormatter())
+    listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    logger.addHandler(handler)
+    logger.setLevel(log_level_name(level, "log level"))
+    logger.propagate = False
+    return listener
+
+
+def log_event(level, event, **fields):
+    """Log a structured event; nothing is built past the level check if the level is disabled"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+def log_response(method, endpoint, headers, response, attempt, streamed=False):
+    """
+    Log one gateway response at DEBUG; a sampled share also records headers
+    and body. The body of a streamed response is left unread.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    fields = {
+        "method": method,
+        "endpoint": endpoint,
+        "status": response.status_code,
+        "attempt": attempt,
+        "elapsed_ms": round(response.elapsed.total_seconds() * 1000, 1),
+    }
+    if LOG_TRACE_SAMPLE_RATE and random.random() < LOG_TRACE_SAMPLE_RATE:
+        fields.update(
+            url=str(response.url),
+            request_headers=dict(headers),
+            response_headers=dict(response.headers),
+        )
+        if not streamed:
+            fields["body"] = response.text[:500]
+    logger.debug("http.response", extra={"fields": fields})
+
+class HTTPTransport:
+    """Pooled, keep-alive HTTP transport shared by MSPAPIClient instances"""
+    
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 host_limits=None, timeout=DEFAULT_TIMEOUT):
+        """
+        host_limits maps a URL prefix (e.g. "https://example.supabase.co") to the
+        maximum number of connections kept open for that host. Pools block when
+        exhausted instead of opening throwaway connections.
+        """
+        self.timeout = timeout
+        self.session = requests.Session()
+        
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        for prefix, limit in (host_limits or {}).items():
+            self.session.mount(prefix, HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=limit,
+                pool_block=True
+            ))
+    
+    def request(self, method, url, **kwargs):
+        """Send a request over the pooled session, applying the default timeout"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+    
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+    
+    def close(self):
+        self.session.close()
+
+@functools.lru_cache(maxsize=None)
+def get_transport():
+    """Process-wide transport, kept alive for the life of the process"""
+    return HTTPTransport()
+
+# Shared Enbox list cache configuration
+ENBOX_CACHE_TTL = 60            # Seconds before a cached /enboxes response is refetched
+ENBOX_CACHE_MAX_ENTRIES = 32    # API keys kept in the cache before LRU eviction
+ENBOX_PAGE_SIZE = 500           # Enboxes requested per /enboxes page
+DELTA_SYNC_OVERLAP = 60         # Seconds an updated_since watermark is backdated to absorb clock skew
+
+# Authentication
+AUTH_CACHE_TTL = 600            # Seconds a validated API key skips the validation call
+
+# Client-side rate limiting
+RATE_LIMIT_BURST_FRACTION = 0.5 # Share of the remaining gateway budget that may be spent without pacing
+RATE_LIMIT_MAX_WAIT = 10        # Seconds a call may wait for budget before failing fast
+RATE_LIMIT_ERROR = "Client-side rate limit"
+
+# Retries and circuit breaking
+RETRY_MAX_ATTEMPTS = 3          # Attempts per call, including the first
+RETRY_BASE_DELAY = 0.5          # Seconds; backoff ceiling doubles each attempt (full jitter)
+RETRY_MAX_DELAY = 8             # Longest single wait; a longer Retry-After fails the call instead
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+CIRCUIT_FAILURE_THRESHOLD = 5   # Consecutive failures before an endpoint's circuit opens
+CIRCUIT_RESET_TIMEOUT = 30      # Seconds an open circuit fails fast before a trial call
+CIRCUIT_OPEN_ERROR = "Circuit open"
+
+# Client metrics
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Seconds
+METRICS_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)    # Bytes
+METRICS_RESERVOIR_SIZE = 2048   # Recent latencies kept per endpoint for percentiles
+METRICS_FILE = os.environ.get("MSP_METRICS_FILE")       # Dump Prometheus text here periodically
+METRICS_DUMP_INTERVAL = 15      # Seconds between metrics file dumps
+METRICS_HOST = os.environ.get("MSP_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.environ.get("MSP_METRICS_PORT")       # Serve /metrics on this port
+
+# Local persistence
+DATA_DIR = os.environ.get("MSP_DATA_DIR", ".msp_data")
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+SNAPSHOT_PRESENT_PREFIX = "__present__:"  # Column marking which records have a sparse field
+SNAPSHOTS_ENABLED = os.environ.get("MSP_ENBOX_SNAPSHOTS", "1") != "0"
+SNAPSHOT_MAX_AGE = 7 * 24 * 3600  # Seconds before a saved Enbox list is too old to show
+
+# Search box field prefixes, e.g. "name:acme" or "rsync:abc123"
+SEARCH_FIELDS = {
+    "id": "id",
+    "rsync": "enbox_rsync_id",
+    "name": "display_name",
+    "via": "created_via",
+}
+
+def parse_search_query(query):
+    """
+    Split a search query into (field, needle) terms. Field-scoped tokens such as
+    name:acme or rsync:"abc 1" become their own terms; the remaining text is one
+    literal phrase (field None) matched against every column.
+    """
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        tokens = query.split()
+    
+    terms, phrase = [], []
+    for token in tokens:
+        field, sep, value = token.partition(":")
+        if sep and field.lower() in SEARCH_FIELDS:
+            if value:
+                terms.append((field.lower(), value.lower()))
+        else:
+            phrase.append(token)
+    
+    if phrase:
+        terms.append((None, " ".join(phrase).lower()))
+    return terms
+
+def _rows_in(rows, posting):
+    """Rows (sorted) that also appear in a sorted posting list"""
+    if len(rows) == 0 or len(posting) == 0:
+        return rows[:0]
+    positions = np.minimum(np.searchsorted(posting, rows), len(posting) - 1)
+    return rows[posting[positions] == rows]
+
+class EnboxSearchIndex:
+    """
+    Literal, case-insensitive search over Enbox records, built once per fetch.
+    
+    Keeps a lowercase text column per searchable field plus a trigram posting
+    index over all of them. Terms of three or more bytes only look at rows that
+    contain every trigram of the term; shorter terms fall back to a scan.
+    """
+    
+    def __init__(self, enboxes):
+        self.fields = {
+            name: [str(e.get(key) or "").lower() for e in enboxes]
+            for name, key in SEARCH_FIELDS.items()
+        }
+        self.fields["status"] = ["active" if e.get("is_active", True) else "inactive" for e in enboxes]
+        self.fields["created"] = [(e.get("created_at") or "")[:10] for e in enboxes]
+        self.texts = ["\x00".join(values) for values in zip(*self.fields.values())]
+        self.size = len(self.texts)
+        self._codes, self._rows = self._build_trigrams(self.texts)
+    
+    @staticmethod
+    def _trigram_codes(data):
+        return (data[:-2].astype(np.uint32) << 16) | (data[1:-1].astype(np.uint32) << 8) | data[2:]
+    
+    @classmethod
+    def _build_trigrams(cls, texts):
+        # NUL separates fields and rows, so trigrams containing it are dropped
+        encoded = [t.encode() for t in texts]
+        if not encoded:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+        data = np.frombuffer(b"\x00".join(encoded) + b"\x00", dtype=np.uint8)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)) + 1
+        row_of = np.repeat(np.arange(len(encoded), dtype=np.uint64), lengths)
+        
+        valid = (data[:-2] != 0) & (data[1:-1] != 0) & (data[2:] != 0)
+        pairs = np.sort((cls._trigram_codes(data)[valid].astype(np.uint64) << 32) | row_of[:-2][valid])
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]  # Sorted, so dedupe neighbours
+        return (pairs >> 32).astype(np.uint32), (pairs & 0xFFFFFFFF).astype(np.uint32)
+    
+    def _candidates(self, needle_bytes):
+        """Sorted rows containing every trigram of the needle, or None if the needle is too short"""
+        if len(needle_bytes) < 3:
+            return None
+        postings = []
+        for code in set(self._trigram_codes(np.frombuffer(needle_bytes, dtype=np.uint8)).tolist()):
+            lo, hi = np.searchsorted(self._codes, np.array([code, code + 1], dtype=np.uint32))
+            postings.append(self._rows[lo:hi])
+        
+        # Start from the rarest trigram and keep rows found in every other posting
+        postings.sort(key=len)
+        rows = postings[0]
+        for posting in postings[1:]:
+            rows = _rows_in(rows, posting)
+        return rows
+    
+    def match(self, query):
+        """Boolean row mask for a search query; all terms must match"""
+        terms = [(field, needle, self._candidates(needle.encode())) for field, needle in parse_search_query(query)]
+        # Most selective terms first, so later terms verify as few rows as possible
+        terms.sort(key=lambda term: self.size if term[2] is None else len(term[2]))
+        
+        rows = np.arange(self.size, dtype=np.uint32)
+        for field, needle, candidates in terms:
+            column = self.fields[field] if field else self.texts
+            if candidates is not None:
+                rows = candidates if len(rows) == self.size else _rows_in(rows, candidates)
+                # A three-byte needle is exactly one trigram, so it only needs verifying within a field
+                if not field and len(needle.encode()) == 3:
+                    continue
+            keep = np.fromiter((needle in column[i] for i in rows.tolist()), dtype=bool, count=len(rows))
+            rows = rows[keep]
+        
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return mask
+
+class EnboxCollection:
+    """
+    Enbox records from one /enboxes fetch, indexed by id and rsync id.
+    
+    sync holds what the next refresh needs to ask only for changes: the
+    list's ETag and Last-Modified validators, an updated_since watermark and
+    whether the gateway honours updated_since.
+    """
+    
+    def __init__(self, enboxes, count=None, sync=None):
+        self.enboxes = list(enboxes)
+        self.count = count if count is not None else len(self.enboxes)
+        self.sync = sync
+        self.by_id = {e.get("id"): e for e in self.enboxes}
+        self.by_rsync_id = {e["enbox_rsync_id"]: e for e in self.enboxes if e.get("enbox_rsync_id")}
+        self._positions = {e.get("id"): i for i, e in enumerate(self.enboxes)}
+        self._search_index = None
+        self._dataframe = None
+    
+    @classmethod
+    def from_response(cls, data):
+        """Build a collection from a raw /enboxes response (object or bare list)"""
+        if isinstance(data, dict):
+            enboxes = data.get('enboxes') or []
+            return cls(enboxes, data.get('count', len(enboxes)))
+        return cls(data or [])
+    
+    def __len__(self):
+        return len(self.enboxes)
+    
+    def __iter__(self):
+        return iter(self.enboxes)
+    
+    def ids(self):
+        """Enbox ids in response order, for selectbox options"""
+        return list(self.by_id)
+    
+    def get(self, enbox_id, default=None):
+        return self.by_id.get(enbox_id, default)
+    
+    def get_by_rsync_id(self, rsync_id, default=None):
+        return self.by_rsync_id.get(rsync_id, default)
+    
+    @property
+    def dataframe(self):
+        """Typed DataFrame of this fetch (see build_enbox_dataframe), built on first use"""
+        if self._dataframe is None:
+            self._dataframe = build_enbox_dataframe(self.enboxes)
+        return self._dataframe
+    
+    @property
+    def search_index(self):
+        """Search index over this fetch, built on first use"""
+        if self._search_index is None:
+            self._search_index = EnboxSearchIndex(self.enboxes)
+        return self._search_index
+    
+    def with_changes(self, enbox_id, **changes):
+        """Return a copy with one Enbox updated; the original is left untouched for concurrent readers"""
+        return self.with_updates({enbox_id: changes})
+    
+    def with_updates(self, updates):
+        """Return a copy with field changes applied to many Enboxes in one pass ({enbox_id: changes})"""
+        positions = [(self._positions[enbox_id], changes) for enbox_id, changes in updates.items()
+                     if enbox_id in self._positions]
+        if not positions:
+            return self
+        enboxes = list(self.enboxes)
+        for position, changes in positions:
+            enboxes[position] = {**enboxes[position], **changes}
+        return EnboxCollection(enboxes, self.count, self.sync)
+    
+    def with_sync(self, sync):
+        """Return a copy with new sync state, sharing records, indexes and any built table or search index"""
+        clone = copy.copy(self)
+        clone.sync = sync
+        return clone
+    
+    def merged(self, records, deleted_ids=(), count=None, sync=None):
+        """
+        Return a copy with a delta applied: changed records replace their old
+        versions in place, new ones are appended and deleted ones dropped.
+        """
+        deleted = set(deleted_ids) | {r.get("id") for r in records if r.get("deleted")}
+        changed = {r.get("id"): r for r in records if not r.get("deleted")}
+        if not changed and not deleted.intersection(self._positions):
+            return self.with_sync(sync)
+        
+        enboxes = [changed.pop(e.get("id"), e) for e in self.enboxes if e.get("id") not in deleted]
+        enboxes.extend(changed.values())
+        return EnboxCollection(enboxes, count if count is not None else len(enboxes), sync)
+
+def sync_watermark():
+    """updated_since value for a fetch starting now, backdated by DELTA_SYNC_OVERLAP"""
+    return (datetime.now(timezone.utc) - timedelta(seconds=DELTA_SYNC_OVERLAP)).isoformat()
+
+def api_key_fingerprint(api_key):
+    """Stable, non-reversible identifier for an API key"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+class EnboxListCache:
+    """
+    Process-wide EnboxCollection cache keyed by API key, with TTL, LRU eviction and single-flight fetches.
+    
+    Expired collections are kept (until evicted) as the base for the next
+    fetch, so a refresh can ask the gateway only for what changed. With a
+    snapshot store, fetched lists are also saved to disk and a cold process
+    starts from the saved list as its stale entry.
+    """
+    
+    def __init__(self, ttl=ENBOX_CACHE_TTL, max_entries=ENBOX_CACHE_MAX_ENTRIES, snapshots=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.snapshots = snapshots
+        self._entries = OrderedDict()  # fingerprint -> (expires_at, EnboxCollection)
+        self._written = set()          # Fingerprints expired by a write; never served stale
+        self._fetch_locks = {}
+        self._lock = threading.Lock()
+    
+    def _lookup(self, key):
+        # Caller must hold self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return data
+    
+    def _expire(self, key):
+        # Caller must hold self._lock
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries[key] = (0, entry[1])
+    
+    def _store(self, key, data):
+        # Caller must hold self._lock
+        previous = self._entries.get(key, (None, None))[1]
+        if self.snapshots is not None:
+            if previous is None or previous.enboxes is not data.enboxes:
+                self.snapshots.save_async(key, data)
+            elif previous.sync != data.sync:
+                # Revalidated without changes: only the sync state and its age move on
+                self.snapshots.save_async(key, data, sync_only=True)
+        self._entries[key] = (time.monotonic() + self.ttl, data)
+        self._entries.move_to_end(key)
+        self._written.discard(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._fetch_locks.pop(evicted_key, None)
+            self._written.discard(evicted_key)
+    
+    def get(self, api_key):
+        """Return the cached response for an API key, or None if missing or expired"""
+        with self._lock:
+            return self._lookup(api_key_fingerprint(api_key))
+    
+    def has(self, api_key):
+        """True if a collection for an API key is in memory, fresh or stale"""
+        with self._lock:
+            return api_key_fingerprint(api_key) in self._entries
+    
+    def _stale(self, key):
+        # Caller must not hold self._lock: an empty slot is filled from the
+        # on-disk snapshot, which is read without blocking other keys
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None or self.snapshots is None:
+            return entry[1] if entry else None
+        
+        snapshot = self.snapshots.load(key)
+        if snapshot is None:
+            return None
+        with self._lock:
+            # A fetch may have filled the slot during the load; keep its collection
+            return self._entries.setdefault(key, (0, snapshot))[1]
+    
+    def get_or_fetch(self, api_key, fetch, force_refresh=False, background_fetch=None):
+        """
+        Return (data, error) from the cache, calling fetch(stale) on a miss,
+        where stale is the expired collection (or saved snapshot) or None.
+        Concurrent misses for the same key wait for a single in-flight fetch
+        instead of each hitting the gateway. Errors are never cached.
+        
+        With background_fetch, a collection that expired by TTL (or a saved
+        snapshot) is returned immediately and background_fetch(stale)
+        refreshes it on a worker thread (stale-while-revalidate). A collection
+        invalidated by a write is never served stale: the next read waits for
+        its revalidation, so the write shows up.
+        """
+        key = api_key_fingerprint(api_key)
+        with self._lock:
+            if force_refresh:
+                self._expire(key)
+            else:
+                data = self._lookup(key)
+                if data is not None:
+                    return data, None
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+            serve_stale = background_fetch is not None and not force_refresh and key not in self._written
+        
+        stale = self._stale(key) if serve_stale else None
+        if stale is not None:
+            self._refresh_in_background(key, fetch_lock, background_fetch, stale)
+            return stale, None
+        
+        with fetch_lock:
+            # Another caller may have filled the entry while we waited
+            with self._lock:
+                data = self._lookup(key)
+            if data is not None:
+                return data, None
+            
+            data, error = fetch(self._stale(key))
+            if error is None:
+                with self._lock:
+                    self._store(key, data)
+            return data, error
+    
+    def _refresh_in_background(self, key, fetch_lock, fetch, stale):
+        if not fetch_lock.acquire(blocking=False):
+            return  # A fetch for this key is already in flight
+        
+        def refresh():
+            try:
+                data, error = fetch(stale)
+                if error is None:
+                    with self._lock:
+                        self._store(key, data)
+                else:
+                    log_event(logging.WARNING, "enboxes.background_refresh_failed", error=error)
+            finally:
+                fetch_lock.release()
+        
+        threading.Thread(target=refresh, name="enbox-refresh", daemon=True).start()
+    
+    def invalidate(self, api_key):
+        """After a write: mark the cached list stale so the next read waits for its revalidation"""
+        key = api_key_fingerprint(api_key)
+        with self._lock:
+            if key in self._entries:
+                self._expire(key)
+                self._written.add(key)
+    
+    def patch(self, api_key, enbox_id, **changes):
+        """Apply field changes to one cached Enbox without refetching the list"""
+        self.patch_many(api_key, {enbox_id: changes})
+    
+    def patch_many(self, api_key, updates):
+        """Apply field changes to many cached Enboxes at once ({enbox_id: changes})"""
+        key = api_key_fingerprint(api_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            expires_at, collection = entry
+            self._entries[key] = (expires_at, collection.with_updates(updates))
+
+def _round_trips(arrow_type, values):
+    """
+    Whether an inferred Arrow column gives back exactly the Python values:
+    only flat primitives do. Structs fill in the union of their keys, and a
+    float column turns ints into floats.
+    """
+    import pyarrow as pa
+    
+    if pa.types.is_floating(arrow_type):
+        return not any(type(value) is int for value in values)
+    return (pa.types.is_null(arrow_type) or pa.types.is_boolean(arrow_type) or pa.types.is_integer(arrow_type)
+            or pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type))
+
+class EnboxSnapshotStore:
+    """
+    Last fetched Enbox list per API key, saved as an Arrow IPC file.
+    
+    Files are named by API key fingerprint and carry the fingerprint, save
+    time, count and sync state in the schema metadata. The save time and
+    sync state are also written to a small JSON sidecar, which is all that
+    is rewritten when a list is revalidated unchanged. Columns that are not
+    flat primitives of one type are stored as JSON text, and fields missing from
+    some records get a presence column so missing and null stay distinct.
+    Writes happen on one background thread and replace files atomically.
+    """
+    
+    def __init__(self, directory=SNAPSHOT_DIR, max_age=SNAPSHOT_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="enbox-snapshot")
+    
+    def path(self, key):
+        return os.path.join(self.directory, f"enboxes-{key}.arrow")
+    
+    def sync_path(self, key):
+        return os.path.join(self.directory, f"enboxes-{key}.sync.json")
+    
+    def save_async(self, key, collection, sync_only=False):
+        self._writer.submit(self.save_sync if sync_only else self.save, key, collection)
+    
+    def save_sync(self, key, collection):
+        """Rewrite only the save time and sync state of an API key fingerprint's snapshot"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.sync_path(key)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"fingerprint": key, "saved_at": time.time(), "sync": collection.sync or {}}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log_event(logging.WARNING, "snapshot.save_failed", error=f"{type(e).__name__}: {e}")
+    
+    def save(self, key, collection):
+        """Write a collection for an API key fingerprint"""
+        import pyarrow as pa
+        
+        try:
+            records = collection.enboxes
+            fields = list(dict.fromkeys(field for record in records for field in record))
+            columns, json_columns, sparse_columns = {}, [], []
+            for field in fields:
+                values = [record.get(field) for record in records]
+                try:
+                    column = pa.array(values)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    column = None
+                if column is None or not _round_trips(column.type, values):
+                    column = pa.array([json.dumps(v) for v in values])
+                    json_columns.append(field)
+                columns[field] = column
+                present = [field in record for record in records]
+                if not all(present):
+                    columns[f"{SNAPSHOT_PRESENT_PREFIX}{field}"] = pa.array(present)
+                    sparse_columns.append(field)
+            
+            table = pa.table(columns).replace_schema_metadata({
+                "fingerprint": key,
+                "saved_at": str(time.time()),
+                "count": str(collection.count),
+                "sync": json.dumps(collection.sync or {}),
+                "json_columns": json.dumps(json_columns),
+                "sparse_columns": json.dumps(sparse_columns),
+            })
+            
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(key)
+            tmp_path = f"{path}.tmp"
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, path)
+        except (OSError, pa.ArrowException) as e:
+            log_event(logging.WARNING, "snapshot.save_failed", error=f"{type(e).__name__}: {e}")
+            return
+        self.save_sync(key, collection)
+    
+    def _load_sync(self, key):
+        """The sidecar's {"saved_at", "sync"}, or None if missing or for another key"""
+        try:
+            with open(self.sync_path(key)) as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(sidecar, dict) or sidecar.get("fingerprint") != key:
+            return None
+        return {"saved_at": float(sidecar.get("saved_at") or 0), "sync": sidecar.get("sync") or {}}
+    
+    def load(self, key):
+        """The saved collection for an API key fingerprint, or None if missing, unreadable or too old"""
+        import pyarrow as pa
+        
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+            saved_at, sync = float(metadata["saved_at"]), json.loads(metadata.get("sync") or "{}")
+            sidecar = self._load_sync(key)
+            if sidecar is not None and sidecar["saved_at"] > saved_at:
+                saved_at, sync = sidecar["saved_at"], sidecar["sync"]
+            if metadata.get("fingerprint") != key or time.time() - saved_at > self.max_age:
+                return None
+            
+            columns = table.to_pydict()
+            present = {
+                field: columns.pop(f"{SNAPSHOT_PRESENT_PREFIX}{field}")
+                for field in json.loads(metadata.get("sparse_columns", "[]"))
+            }
+            for field in json.loads(metadata.get("json_columns", "[]")):
+                columns[field] = [json.loads(v) for v in columns[field]]
+            fields = list(columns)
+            records = [dict(zip(fields, row)) for row in zip(*columns.values())]
+            for field, flags in present.items():
+                for record, is_present in zip(records, flags):
+                    if not is_present:
+                        del record[field]
+            return EnboxCollection(records, int(metadata["count"]), sync or None)
+        except (OSError, KeyError, ValueError, pa.ArrowException) as e:
+            log_event(logging.WARNING, "snapshot.load_failed", error=f"{type(e).__name__}: {e}")
+            return None
+
+@functools.lru_cache(maxsize=None)
+def get_snapshot_store():
+    """Snapshot store for the shared cache, or None if disabled or pyarrow is missing"""
+    if not SNAPSHOTS_ENABLED:
+        return None
+    try:
+        import pyarrow  # noqa: F401  (ships with Streamlit, but is optional here)
+    except ImportError:
+        return None
+    return EnboxSnapshotStore()
+
+@functools.lru_cache(maxsize=None)
+def get_enbox_cache():
+    """Enbox list cache shared by every session of this deployment"""
+    return EnboxListCache(snapshots=get_snapshot_store())
+
+class ValidatedKeyCache:
+    """API keys (by fingerprint) that recently passed validation, so new sessions skip the check"""
+    
+    def __init__(self, ttl=AUTH_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._validated_at = {}
+    
+    def is_valid(self, api_key):
+        with self._lock:
+            validated_at = self._validated_at.get(api_key_fingerprint(api_key))
+        return validated_at is not None and time.time() - validated_at < self.ttl
+    
+    def mark_valid(self, api_key):
+        with self._lock:
+            self._validated_at[api_key_fingerprint(api_key)] = time.time()
+    
+    def invalidate(self, api_key):
+        with self._lock:
+            self._validated_at.pop(api_key_fingerprint(api_key), None)
+
+@functools.lru_cache(maxsize=None)
+def get_validated_keys():
+    """Validated-key cache shared by every session of this deployment"""
+    return ValidatedKeyCache()
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """Raised when the client-side rate limiter has no budget for a call"""
+
+def parse_rate_limit_time(value, now=None):
+    """Epoch seconds for a reset/Retry-After value: delta or epoch seconds, HTTP date or ISO timestamp"""
+    if value is None or value == "":
+        return None
+    now = time.time() if now is None else now
+    try:
+        number = float(value)
+        return number if number > 1e9 else now + number
+    except (TypeError, ValueError):
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+class RateLimiter:
+    """
+    Token bucket pacing every call made with one API key.
+    
+    The budget is learned from the gateway: rate_limit in /stats, X-RateLimit-*
+    (or RateLimit-*) response headers, and Retry-After on 429. Until the window
+    resets, tokens refill at remaining / seconds-to-reset and the bucket holds
+    at most RATE_LIMIT_BURST_FRACTION of the remaining budget, so bursts are
+    allowed but the window is never drained early. With no budget known, calls
+    pass freely.
+    """
+    
+    def __init__(self, burst_fraction=RATE_LIMIT_BURST_FRACTION, max_wait=RATE_LIMIT_MAX_WAIT):
+        self.burst_fraction = burst_fraction
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._remaining = None      # Calls left in the gateway window, None if unknown
+        self._reset_at = None       # Epoch seconds when the window resets
+        self._tokens = 0.0
+        self._updated = time.time()
+        self._blocked_until = 0.0   # No call starts before this (after a 429 or an empty window)
+    
+    def _capacity(self):
+        return max(1.0, self._remaining * self.burst_fraction)
+    
+    def update(self, remaining=None, reset_at=None):
+        """Record the gateway's view of the budget"""
+        with self._lock:
+            if reset_at is not None:
+                self._reset_at = reset_at
+            if remaining is None:
+                return
+            first = self._remaining is None
+            self._remaining = max(int(remaining), 0)
+            self._tokens = self._capacity() if first else min(self._tokens, self._capacity())
+            self._updated = time.time()
+            if self._remaining == 0 and self._reset_at:
+                self._blocked_until = max(self._blocked_until, self._reset_at)
+    
+    def update_from_stats(self, rate_limit):
+        """Learn the budget from the rate_limit object returned by /stats"""
+        if rate_limit:
+            self.update(rate_limit.get("remaining"), parse_rate_limit_time(rate_limit.get("reset_at")))
+    
+    def observe(self, status_code, headers):
+        """Learn the budget from a response's rate limit headers"""
+        remaining = headers.get("X-RateLimit-Remaining") or headers.get("RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset") or headers.get("RateLimit-Reset")
+        try:
+            remaining = int(remaining) if remaining is not None else None
+        except ValueError:
+            remaining = None
+        self.update(remaining, parse_rate_limit_time(reset))
+        
+        if status_code == 429:
+            now = time.time()
+            retry_at = parse_rate_limit_time(headers.get("Retry-After"), now)
+            with self._lock:
+                self._remaining = 0
+                self._tokens = 0.0
+                self._blocked_until = max(self._blocked_until, retry_at or self._reset_at or now + 1)
+    
+    def reserve(self):
+        """Take a token if one is available; otherwise return the seconds to wait before trying again"""
+        with self._lock:
+            now = time.time()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self._reset_at is not None and now >= self._reset_at:
+                # Window rolled over; the budget is unknown until the gateway reports it again
+                self._remaining = self._reset_at = None
+            if self._remaining is None:
+                return 0.0
+            if self._reset_at is None:
+                self._remaining = max(self._remaining - 1, 0)
+                return 0.0
+            
+            rate = self._remaining / max(self._reset_at - now, 1e-3)
+            self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._remaining -= 1
+                return 0.0
+            return (1 - self._tokens) / rate if rate > 0 else self._reset_at - now
+    
+    def acquire(self):
+        """Block until a call may start; returns an error string instead if that would exceed max_wait"""
+        deadline = time.time() + self.max_wait
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return None
+            if time.time() + wait > deadline:
+                return f"{RATE_LIMIT_ERROR}: gateway budget exhausted, retry in {wait:.0f}s"
+            time.sleep(wait)
+    
+    async def acquire_async(self):
+        """acquire() for coroutines; waits without blocking the event loop"""
+        deadline = time.time() + self.max_wait
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return None
+            if time.time() + wait > deadline:
+                return f"{RATE_LIMIT_ERROR}: gateway budget exhausted, retry in {wait:.0f}s"
+            await asyncio.sleep(wait)
+
+@functools.lru_cache(maxsize=None)
+def get_rate_limiter(key):
+    """Rate limiter shared by every client, thread and session using one API key (fingerprint)"""
+    return RateLimiter()
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an endpoint whose circuit is open"""
+
+def is_retryable_exception(error):
+    """Whether a transport error is transient: connection failures and timeouts"""
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              httpx.TransportError))
+
+def request_never_sent(error):
+    """Whether a transport error happened before the request reached the gateway"""
+    if isinstance(error, (requests.exceptions.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+class RetryPolicy:
+    """
+    When, and after how long, a failed call is retried.
+    
+    Idempotent calls (GETs, activate/deactivate) are retried on connection
+    errors, timeouts and RETRY_STATUSES. Other calls, like create_enbox and
+    send_email, are only retried when the gateway cannot have acted on them:
+    a 429, or a connection that was never established. Waits use full-jitter
+    exponential backoff and never undercut Retry-After.
+    """
+    
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, statuses=RETRY_STATUSES):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.statuses = statuses
+    
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+    
+    def delay_for_response(self, status_code, headers, attempt, idempotent):
+        """Seconds to wait before retrying after this response, or None to return it"""
+        if attempt >= self.max_attempts or status_code not in self.statuses:
+            return None
+        if not idempotent and status_code != 429:
+            return None
+        
+        delay = self.backoff(attempt)
+        retry_at = parse_rate_limit_time(headers.get("Retry-After"))
+        if retry_at is not None:
+            wait = retry_at - time.time()
+            if wait > self.max_delay:
+                return None
+            delay = max(delay, wait)
+        return delay
+    
+    def delay_for_error(self, error, attempt, idempotent):
+        """Seconds to wait before retrying after this transport error, or None to raise it"""
+        if attempt >= self.max_attempts or not is_retryable_exception(error):
+            return None
+        if not (idempotent or request_never_sent(error)):
+            return None
+        return self.backoff(attempt)
+
+class CircuitBreaker:
+    """
+    Fails fast for an endpoint that keeps failing.
+    
+    After CIRCUIT_FAILURE_THRESHOLD consecutive transport errors or 5xx
+    responses the circuit opens and calls are refused for
+    CIRCUIT_RESET_TIMEOUT seconds. Then one trial call is let through: success
+    closes the circuit, failure opens it again.
+    """
+    
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+    
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.time() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+    
+    def before_call(self, endpoint):
+        """None if the call may go ahead, otherwise an error string"""
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            wait = self._opened_at + self.reset_timeout - time.time()
+            if wait > 0 or self._trial_in_flight:
+                return f"{CIRCUIT_OPEN_ERROR} for {endpoint}: gateway failing, retry in {max(wait, 1):.0f}s"
+            self._trial_in_flight = True
+            return None
+    
+    def record(self, success):
+        with self._lock:
+            self._trial_in_flight = False
+            if success:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._failures >= self.failure_threshold or self._opened_at is not None:
+                self._opened_at = time.time()
+
+@functools.lru_cache(maxsize=None)
+def get_circuit_breaker(endpoint):
+    """Circuit breaker shared by every client for one endpoint"""
+    return CircuitBreaker()
+
+def endpoint_key(method, url):
+    """Endpoint a URL belongs to, e.g. 'POST host/enboxes/{id}/activate'"""
+    parts = requests.utils.urlparse(url)
+    path = re.sub(r"/[0-9a-fA-F-]{8,}(?=/|$)", "/{id}", parts.path.rstrip("/"))
+    return f"{method} {parts.netloc}{path}"
+
+class Histogram:
+    """Cumulative-bucket histogram, plus a bounded reservoir of recent samples for percentiles"""
+    
+    def __init__(self, buckets, reservoir_size=0):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=reservoir_size) if reservoir_size else None
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.recent is not None:
+            self.recent.append(value)
+
+def _labels(**labels):
+    """Prometheus label set, escaping backslashes, quotes and newlines"""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class MetricsRegistry:
+    """
+    Process-wide gateway call metrics, keyed by endpoint.
+    
+    Records per-endpoint latency and payload size histograms, request
+    counts by status (or exception name) and retries. Recording is a few
+    additions under one lock; percentiles and the Prometheus text are
+    computed only when read.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}           # endpoint -> Histogram of seconds
+        self.request_bytes = {}     # endpoint -> Histogram of bytes sent
+        self.response_bytes = {}    # endpoint -> Histogram of bytes received
+        self.requests = Counter()   # (endpoint, status) -> calls
+        self.retries = Counter()    # endpoint -> retries
+        self.coalesced = Counter()  # (cache, outcome) -> reads
+        self.started_at = time.time()
+    
+    def record_request(self, endpoint, status, seconds, request_bytes=None, response_bytes=None):
+        with self._lock:
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(METRICS_LATENCY_BUCKETS, METRICS_RESERVOIR_SIZE)
+                self.request_bytes[endpoint] = Histogram(METRICS_SIZE_BUCKETS)
+                self.response_bytes[endpoint] = Histogram(METRICS_SIZE_BUCKETS)
+            self.latency[endpoint].observe(seconds)
+            if request_bytes is not None:
+                self.request_bytes[endpoint].observe(request_bytes)
+            if response_bytes is not None:
+                self.response_bytes[endpoint].observe(response_bytes)
+            self.requests[(endpoint, str(status))] += 1
+    
+    def record_retry(self, endpoint):
+        with self._lock:
+            self.retries[endpoint] += 1
+    
+    def record_coalesced(self, cache, outcome):
+        """Count how a coalescing cache served a read: "fetched", "hit" or "joined" an in-flight fetch"""
+        with self._lock:
+            self.coalesced[(cache, outcome)] += 1
+    
+    def coalescing(self, cache):
+        """Reads served by a coalescing cache, by outcome"""
+        with self._lock:
+            return {outcome: count for (name, outcome), count in self.coalesced.items() if name == cache}
+    
+    def summary(self):
+        """One row per endpoint: calls, errors, retries, latency percentiles (ms) and mean response size"""
+        with self._lock:
+            samples = {endpoint: list(h.recent) for endpoint, h in self.latency.items()}
+            calls = Counter()
+            errors = Counter()
+            for (endpoint, status), count in self.requests.items():
+                calls[endpoint] += count
+                if not status.isdigit() or int(status) >= 400:
+                    errors[endpoint] += count
+            sizes = {e: (h.sum / h.count if h.count else 0) for e, h in self.response_bytes.items()}
+            retries = dict(self.retries)
+        
+        rows = []
+        for endpoint in sorted(samples):
+            p50, p95, p99 = (float(v) for v in np.percentile(samples[endpoint], [50, 95, 99]) * 1000)
+            rows.append({
+                "endpoint": endpoint,
+                "calls": calls[endpoint],
+                "errors": errors[endpoint],
+                "retries": retries.get(endpoint, 0),
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "mean_response_bytes": sizes.get(endpoint, 0),
+            })
+        return rows
+    
+    def render_prometheus(self):
+        """Prometheus text exposition of every metric"""
+        lines = []
+        with self._lock:
+            for name, help_text, histograms in (
+                ("msp_client_request_duration_seconds", "Gateway call latency", self.latency),
+                ("msp_client_request_size_bytes", "Request body size", self.request_bytes),
+                ("msp_client_response_size_bytes", "Response body size", self.response_bytes),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for endpoint, h in sorted(histograms.items()):
+                    cumulative = 0
+                    for le, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(endpoint=endpoint, le=le)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(endpoint=endpoint)} {h.sum}")
+                    lines.append(f"{name}_count{_labels(endpoint=endpoint)} {h.count}")
+            
+            lines += ["# HELP msp_client_requests_total Gateway calls by status code or exception",
+                      "# TYPE msp_client_requests_total counter"]
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f"msp_client_requests_total{_labels(endpoint=endpoint, status=status)} {count}")
+            
+            lines += ["# HELP msp_client_retries_total Gateway calls retried",
+                      "# TYPE msp_client_retries_total counter"]
+            for endpoint, count in sorted(self.retries.items()):
+                lines.append(f"msp_client_retries_total{_labels(endpoint=endpoint)} {count}")
+            
+            lines += ["# HELP msp_client_coalesced_reads_total Cached reads by outcome (fetched, hit, joined)",
+                      "# TYPE msp_client_coalesced_reads_total counter"]
+            for (cache, outcome), count in sorted(self.coalesced.items()):
+                lines.append(f"msp_client_coalesced_reads_total{_labels(cache=cache, outcome=outcome)} {count}")
+        return "\n".join(lines) + "\n"
+    
+    def dump(self, path):
+        """Atomically write the Prometheus text to path, e.g. for node_exporter's textfile collector"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+@functools.lru_cache(maxsize=None)
+def get_metrics():
+    """Metrics registry shared by every client and session in this process"""
+    return MetricsRegistry()
+
+def payload_sizes(response, streamed=False):
+    """
+    (request body, response body) sizes in bytes for a requests or httpx
+    response. A streamed body is not read, so its size comes from
+    Content-Length (None when the gateway sends none).
+    """
+    request = response.request
+    body = request.body if hasattr(request, "body") else request.content
+    if streamed:
+        length = response.headers.get("Content-Length")
+        return len(body or b""), int(length) if length and length.isdigit() else None
+    return len(body or b""), len(response.content)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics registry at /metrics"""
+    
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+@functools.lru_cache(maxsize=None)
+def start_metrics_exporters(metrics_file=METRICS_FILE, host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Start the optional /metrics endpoint and periodic file dump; runs once
+    per process. If the port is invalid or taken, the app carries on without
+    the endpoint.
+    """
+    metrics = get_metrics()
+    
+    if port:
+        try:
+            server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+        except (OSError, ValueError) as e:
+            log_event(logging.WARNING, "metrics.http_unavailable", host=host, port=port, error=str(e))
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    
+    if metrics_file:
+        def dump_forever():
+            while True:
+                time.sleep(METRICS_DUMP_INTERVAL)
+                try:
+                    metrics.dump(metrics_file)
+                except OSError as e:
+                    log_event(logging.WARNING, "metrics.dump_failed", path=metrics_file, error=str(e))
+        threading.Thread(target=dump_forever, name="metrics-dump", daemon=True).start()
+    return metrics
+
+class GatewayCall:
+    """
+    Bookkeeping for one logical request across its attempts, shared by the
+    sync and async clients' _send: rate limiting, the circuit breaker,
+    metrics, logging and retry decisions. The clients only send, sleep and
+    close responses.
+    """
+    
+    def __init__(self, client, method, url, email=False, idempotent=None, headers=None, streamed=False):
+        self.client = client
+        self.method = method
+        self.email = email
+        self.streamed = streamed
+        self.limiter = client.email_rate_limiter if email else client.rate_limiter
+        self.endpoint = endpoint_key(method, url)
+        self.breaker = get_circuit_breaker(self.endpoint)
+        self.headers = {**(client.email_headers if email else client.headers), **(headers or {})}
+        self.idempotent = method == "GET" if idempotent is None else idempotent
+    
+    def admit(self, limiter_error):
+        """Raise if the rate limiter (its acquire() result) or the circuit breaker refuses the next attempt"""
+        if limiter_error:
+            log_event(logging.INFO, "http.rate_limited", endpoint=self.endpoint)
+            raise RateLimitExceeded(limiter_error)
+        error = self.breaker.before_call(self.endpoint)
+        if error:
+            log_event(logging.INFO, "http.circuit_open", endpoint=self.endpoint)
+            raise CircuitOpenError(error)
+    
+    def failed(self, error, attempt, started):
+        """Record a transport error; the delay before retrying, or None to re-raise it"""
+        self.client.metrics.record_request(self.endpoint, type(error).__name__, time.perf_counter() - started)
+        self.breaker.record(False)
+        delay = self.client.retry_policy.delay_for_error(error, attempt, self.idempotent)
+        if delay is not None:
+            self.client.metrics.record_retry(self.endpoint)
+            log_event(logging.INFO, "http.retry", endpoint=self.endpoint, attempt=attempt,
+                      error=type(error).__name__, delay=round(delay, 3))
+        return delay
+    
+    def completed(self, response, attempt, started):
+        """Record a response; the delay before retrying, or None to return it"""
+        self.client.metrics.record_request(self.endpoint, response.status_code, time.perf_counter() - started,
+                                           *payload_sizes(response, self.streamed))
+        log_response(self.method, self.endpoint, self.headers, response, attempt, self.streamed)
+        self.limiter.observe(response.status_code, response.headers)
+        if response.status_code == 401 and not self.email:
+            get_validated_keys().invalidate(self.client.api_key)
+        self.breaker.record(response.status_code < 500)
+        delay = self.client.retry_policy.delay_for_response(
+            response.status_code, response.headers, attempt, self.idempotent
+        )
+        if delay is not None:
+            self.client.metrics.record_retry(self.endpoint)
+            log_event(logging.INFO, "http.retry", endpoint=self.endpoint, attempt=attempt,
+                      status=response.status_code, delay=round(delay, 3))
+        return delay
+
+class GatewayClientBase:
+    """
+    Setup and request building shared by MSPAPIClient and AsyncMSPAPIClient;
+    subclasses add how requests are sent.
+    """
+    
+    PROBE_ENDPOINTS = ("/enboxes", "/stats", "/usage")
+    
+    def __init__(self, api_key, email_api_key=None, enbox_cache=None,
+                 rate_limiter=None, email_rate_limiter=None, retry_policy=None,
+                 base_url=BASE_URL, email_base_url=EMAIL_BASE_URL):
+        self.api_key = api_key
+        self.email_api_key = email_api_key
+        self.enbox_cache = enbox_cache if enbox_cache is not None else get_enbox_cache()
+        self.rate_limiter = rate_limiter or get_rate_limiter(api_key_fingerprint(api_key))
+        self.email_rate_limiter = email_rate_limiter or get_rate_limiter(
+            api_key_fingerprint(email_api_key or api_key) + "/email"
+        )
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = get_metrics()
+        self.base_url = base_url
+        self.email_base_url = email_base_url
+        self.headers = {
+            "Content-Type": "application/json",
+            "x-msp-api-key": api_key
+        }
+        self.email_headers = {
+            "Content-Type": "application/json",
+            "x-api-key": email_api_key if email_api_key else api_key
+        }
+    
+    def _url(self, path):
+        return f"{self.base_url}{path}"
+    
+    def _enbox_url(self, enbox_id=None, action=None):
+        """/enboxes, /enboxes/{id} or /enboxes/{id}/{action} on the MSP gateway"""
+        path = "/enboxes" if enbox_id is None else f"/enboxes/{enbox_id}"
+        return self._url(f"{path}/{action}" if action else path)
+    
+    def _email_url(self):
+        return f"{self.email_base_url}/emails"
+    
+    @staticmethod
+    def _enbox_list_params(limit=None, offset=None, cursor=None):
+        """Query params for one /enboxes page, or None for the whole listing"""
+        params = {k: v for k, v in (("limit", limit), ("offset", offset), ("cursor", cursor)) if v is not None}
+        return params or None
+    
+    @staticmethod
+    def _create_enbox_payload(email, password=None, display_name=None, create_via="direct"):
+        """(payload, error) for POST /enboxes; direct creation requires a password"""
+        payload = {
+            "email": email,
+            "create_via": create_via
+        }
+        
+        if create_via == "direct":
+            if not password:
+                return None, "Password is required for direct creation"
+            payload["password"] = password
+        
+        if display_name:
+            payload["display_name"] = display_name
+        return payload, None
+    
+    @staticmethod
+    def _email_payload(to, subject, body):
+        return {
+            "to": to,
+            "subject": subject,
+            "body": body
+        }
+
+
+class MSPAPIClient(GatewayClientBase):
+    """Client for MSP API operations"""
+    
+    def __init__(self, api_key, email_api_key=None, transport=None, enbox_cache=None,
+                 rate_limiter=None, email_rate_limiter=None, retry_policy=None,
+                 base_url=BASE_URL, email_base_url=EMAIL_BASE_URL):
+        super().__init__(api_key, email_api_key, enbox_cache, rate_limiter, email_rate_limiter,
+                         retry_policy, base_url, email_base_url)
+        self.transport = transport if transport is not None else get_transport()
+    
+    def _send(self, method, url, email=False, idempotent=None, headers=None, **kwargs):
+        """
+        Send one request through the rate limiter, circuit breaker and retry policy.
+        
+        idempotent defaults to True for GET; headers are added to the API key
+        headers. Returns the last response, or raises the last transport error
+        once retries are exhausted.
+        """
+        call = GatewayCall(self, method, url, email, idempotent, headers, streamed=kwargs.get("stream", False))
+        attempt = 0
+        while True:
+            attempt += 1
+            call.admit(call.limiter.acquire())
+            started = time.perf_counter()
+            try:
+                response = self.transport.request(method, url, headers=call.headers, **kwargs)
+            except requests.exceptions.RequestException as e:
+                delay = call.failed(e, attempt, started)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            
+            delay = call.completed(response, attempt, started)
+            if delay is None:
+                return response
+            response.close()  # Release the connection of a streamed response before waiting
+            time.sleep(delay)
+    
+    def test_connection(self):
+        """Test the API connection and key validity"""
+        try:
+            results = {}
+            for endpoint in self.PROBE_ENDPOINTS:
+                try:
+                    response = self._send("GET", self._url(endpoint), timeout=10)
+                    results[endpoint] = {
+                        "status": response.status_code,
+                        "text": response.text[:200],
+                        "headers": dict(response.headers)
+                    }
+                except Exception as e:
+                    results[endpoint] = {"error": str(e)}
+                    log_event(logging.WARNING, "probe.failed", endpoint=endpoint, error=str(e))
+            
+            return results, None
+        except Exception as e:
+            return None, str(e)
+    
+    def get_enboxes(self, limit=None, offset=None, cursor=None):
+        """Fetch all Enboxes, or one page of them when limit/offset/cursor are given"""
+        try:
+            params = self._enbox_list_params(limit, offset, cursor)
+            # Streamed so a large listing is parsed as it arrives, never held whole as bytes and text
+            with contextlib.closing(self._send("GET", self._enbox_url(), params=params, stream=True)) as response:
+                response.raise_for_status()
+                return load_enbox_response(response), None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log_event(logging.WARNING, "enboxes.fetch_failed", error=f"{type(e).__name__}: {e}")
+            return None, str(e)
+    
+    def iter_enbox_pages(self, page_size=ENBOX_PAGE_SIZE):
+        """
+        Yield (page, error) tuples, where page is {"enboxes": [...], "count": total}.
+        
+        Follows the gateway's next_cursor when it returns one and limit/offset
+        otherwise. If the gateway ignores pagination and returns the whole list,
+        that response is chunked client-side so callers still see pages.
+        """
+        offset, cursor, previous_first_id = 0, None, None
+        while True:
+            if cursor:
+                data, error = self.get_enboxes(limit=page_size, cursor=cursor)
+            else:
+                data, error = self.get_enboxes(limit=page_size, offset=offset)
+            if error:
+                yield None, error
+                return
+            
+            if isinstance(data, dict):
+                records = data.get('enboxes') or []
+                total = data.get('count')
+                cursor = data.get('next_cursor')
+            else:
+                records, total, cursor = data or [], None, None
+            
+            if len(records) > page_size:
+                # Pagination not supported: chunk the full response
+                for start in range(0, len(records), page_size):
+                    yield {"enboxes": records[start:start + page_size], "count": total or len(records)}, None
+                return
+            
+            # Same first row as the previous page means offset was ignored
+            first_id = records[0].get("id") if records else None
+            if records and first_id == previous_first_id:
+                return
+            previous_first_id = first_id
+            
+            yield {"enboxes": records, "count": total}, None
+            
+            offset += len(records)
+            if cursor:
+                continue
+            if len(records) < page_size or (total is not None and offset >= total):
+                return
+    
+    def get_enbox_changes(self, sync):
+        """
+        Conditional /enboxes request against a previous sync, asking only for
+        Enboxes updated since its watermark when the gateway supports that.
+        
+        Returns ({"modified": bool, "data": body or None, "sync": new sync}, error).
+        """
+        headers = {}
+        if sync.get("etag"):
+            headers["If-None-Match"] = sync["etag"]
+        if sync.get("last_modified"):
+            headers["If-Modified-Since"] = sync["last_modified"]
+        params = {"updated_since": sync["watermark"]} if sync.get("delta", True) else None
+        
+        watermark = sync_watermark()
+        try:
+            with contextlib.closing(
+                self._send("GET", self._enbox_url(), headers=headers, params=params, stream=True)
+            ) as response:
+                response.raise_for_status()
+                data = load_enbox_response(response) if response.status_code != 304 else None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log_event(logging.WARNING, "enboxes.sync_failed", error=f"{type(e).__name__}: {e}")
+            return None, str(e)
+        
+        new_sync = {
+            **sync,
+            "etag": response.headers.get("ETag") or sync.get("etag"),
+            "last_modified": response.headers.get("Last-Modified") or sync.get("last_modified"),
+            "watermark": watermark,
+            "fetched_at": time.time(),
+        }
+        if response.status_code == 304:
+            return {"modified": False, "data": None, "sync": new_sync}, None
+        return {"modified": True, "data": data, "sync": new_sync}, None
+    
+    def list_enboxes(self, force_refresh=False, on_page=None, stale_ok=False):
+        """
+        Fetch all Enboxes as an indexed EnboxCollection, through the process-wide cache.
+        
+        A stale cached collection is refreshed with one conditional/delta
+        request; with stale_ok it is returned at once and refreshed in the
+        background instead. on_page(page, loaded, total) is called after each
+        page when this call performs a full paged fetch, so pages can render
+        before the full list arrives.
+        """
+        return self.enbox_cache.get_or_fetch(
+            self.api_key,
+            lambda stale: self._sync_enbox_collection(stale, on_page),
+            force_refresh,
+            background_fetch=(lambda stale: self._sync_enbox_collection(stale)) if stale_ok else None
+        )
+    
+    def _sync_enbox_collection(self, base, on_page=None):
+        if base is None or base.sync is None:
+            return self._fetch_enbox_collection(on_page)
+        
+        result, error = self.get_enbox_changes(base.sync)
+        if error:
+            return None, error
+        sync = result["sync"]
+        if not result["modified"]:
+            log_event(logging.DEBUG, "enboxes.sync", outcome="not_modified")
+            return base.with_sync(sync), None
+        
+        data = result["data"]
+        if isinstance(data, dict) and data.get("delta"):
+            records = data.get("enboxes") or []
+            log_event(logging.DEBUG, "enboxes.sync", outcome="delta", changed=len(records))
+            return base.merged(records, data.get("deleted_ids") or [], data.get("count"), sync), None
+        
+        # The gateway ignored updated_since, so the body is a full listing
+        collection = EnboxCollection.from_response(data)
+        sync["delta"] = False
+        if collection.count > len(collection):
+            return self._fetch_enbox_collection(on_page, sync)
+        log_event(logging.DEBUG, "enboxes.sync", outcome="full", rows=len(collection))
+        return collection.with_sync(sync), None
+    
+    def _fetch_enbox_collection(self, on_page=None, sync=None):
+        sync = {**(sync or {}), "watermark": sync_watermark(), "fetched_at": time.time()}
+        records, total = [], None
+        for page, error in self.iter_enbox_pages():
+            if error:
+                return None, error
+            records.extend(page["enboxes"])
+            total = page["count"]
+            if on_page:
+                on_page(page, len(records), total)
+        return EnboxCollection(records, total if total is not None else len(records), sync), None
+    
+    def create_enbox(self, email, password=None, display_name=None, create_via="direct"):
+        """Create a new Enbox - either direct (with password) or invite (without password)"""
+        payload, error = self._create_enbox_payload(email, password, display_name, create_via)
+        if error:
+            return None, error
+        try:
+            response = self._send("POST", self._enbox_url(), json=payload)
+            response.raise_for_status()
+            result = response.json()
+            self.enbox_cache.invalidate(self.api_key)
+            return result, None
+        except requests.exceptions.RequestException as e:
+            return None, str(e)
+    
+    def get_enbox(self, enbox_id):
+        """Get specific Enbox details"""
+        try:
+            response = self._send("GET", self._enbox_url(enbox_id))
+            response.raise_for_status()
+            return response.json(), None
+        except requests.exceptions.RequestException as e:
+            return None, str(e)
+    
+    def activate_enbox(self, enbox_id, update_cache=True):
+        """Activate an Enbox; bulk callers pass update_cache=False and reconcile the cache once"""
+        try:
+            response = self._send("POST", self._enbox_url(enbox_id, "activate"), idempotent=True)
+            response.raise_for_status()
+            result = response.json()
+            if update_cache:
+                self.enbox_cache.patch(self.api_key, enbox_id, is_active=True)
+            return result, None
+        except requests.exceptions.RequestException as e:
+            return None, str(e)
+    
+    def deactivate_enbox(self, enbox_id, update_cache=True):
+        """Deactivate an Enbox; bulk callers pass update_cache=False and reconcile the cache once"""
+        try:
+            response = self._send("POST", self._enbox_url(enbox_id, "deactivate"), idempotent=True)
+            response.raise_for_status()
+            result = response.json()
+            if update_cache:
+                self.enbox_cache.patch(self.api_key, enbox_id, is_active=False)
+            return result, None
+        except requests.exceptions.RequestException as e:
+            return None, str(e)
+    
+    def validate_key(self):
+        """
+        Check the API key with one lightweight call (/stats).
+        
+        Keys validated within AUTH_CACHE_TTL are accepted without a call.
+        Returns (True, None) or (None, error).
+        """
+        validated_keys = get_validated_keys()
+        if validated_keys.is_valid(self.api_key):
+            return True, None
+        
+        _, error = self.get_stats()
+        if error:
+            return None, error
+        validated_keys.mark_valid(self.api_key)
+        return True, None
+    
+    def get_stats(self):
+        """Get MSP dashboard statistics"""
+        try:
+            response = self._send("GET", self._url("/stats"))
+            response.raise_for_status()
+            result = response.json()
+            self.rate_limiter.update_from_stats(result.get('rate_limit'))
+            return result, None
+        except requests.exceptions.RequestException as e:
+            return None, str(e)
+    
+    def get_usage(self):
+        """Get API usage statistics"""
+        try:
+            response = self._send("GET", self._url("/usage"))
+            response.raise_for_status()
+            return response.json(), None
+        except requests.exceptions.RequestException as e:
+            return None, str(e)
+    
+    def send_email(self, to, subject, body):
+        """Send an email via the API Gateway"""
+        try:
+            response = self._send(
+                "POST",
+                self._email_url(),
+                email=True,
+                json=self._email_payload(to, subject, body),
+                timeout=30
+            )
+            
+            if response.status_code == 401:
+                error_msg = f"Authentication failed. Please check your email API key. Response: {response.text}"
+                return None, error_msg
+            
+            response.raise_for_status()
+            return response.json(), None
+        except requests.exceptions.RequestException as e:
+            error_detail = f"{type(e).__name__}: {str(e)}"
+            if hasattr(e, 'response') and e.response is not None:
+                error_detail += f" | Response: {e.response.text}"
+            log_event(logging.WARNING, "email.send_failed", error=error_detail)
+            return None, error_detail
+
+class AsyncLoopRunner:
+    """Background event loop that lets synchronous callers await coroutines"""
+    
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="msp-async-loop", daemon=True)
+        self.thread.start()
+    
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the background loop and block until it finishes"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+@functools.lru_cache(maxsize=None)
+def get_async_runner():
+    """Process-wide event loop shared by all sessions"""
+    return AsyncLoopRunner()
+
+@functools.lru_cache(maxsize=None)
+def get_async_http_client():
+    """Process-wide pooled httpx client, only used from the shared event loop"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0])
+    )
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return get_async_runner().run(coro)
+
+class AsyncMSPAPIClient(GatewayClientBase):
+    """Asyncio variant of MSPAPIClient for issuing independent calls concurrently"""
+    
+    def __init__(self, api_key, email_api_key=None, http_client=None, enbox_cache=None,
+                 rate_limiter=None, email_rate_limiter=None, retry_policy=None,
+                 base_url=BASE_URL, email_base_url=EMAIL_BASE_URL):
+        super().__init__(api_key, email_api_key, enbox_cache, rate_limiter, email_rate_limiter,
+                         retry_policy, base_url, email_base_url)
+        self.http = http_client if http_client is not None else get_async_http_client()
+    
+    async def gather(self, *coros):
+        """Await several client calls concurrently, returning their (data, error) tuples in order"""
+        return await asyncio.gather(*coros)
+    
+    async def _send(self, method, url, email=False, idempotent=None, headers=None, **kwargs):
+        """Async twin of MSPAPIClient._send"""
+        call = GatewayCall(self, method, url, email, idempotent, headers)
+        attempt = 0
+        while True:
+            attempt += 1
+            call.admit(await call.limiter.acquire_async())
+            started = time.perf_counter()
+            try:
+                response = await self.http.request(method, url, headers=call.headers, **kwargs)
+            except httpx.HTTPError as e:
+                delay = call.failed(e, attempt, started)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            
+            delay = call.completed(response, attempt, started)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+    
+    async def _request(self, method, url, **kwargs):
+        try:
+            response = await self._send(method, url, **kwargs)
+            response.raise_for_status()
+            return response.json(), None
+        except (httpx.HTTPError, RateLimitExceeded, CircuitOpenError, ValueError) as e:
+            return None, str(e)
+    
+    async def _probe(self, endpoint):
+        try:
+            response = await self._send("GET", self._url(endpoint), timeout=10)
+            return {
+                "status": response.status_code,
+                "text": response.text[:200],
+                "headers": dict(response.headers)
+            }
+        except Exception as e:
+            log_event(logging.WARNING, "probe.failed", endpoint=endpoint, error=str(e))
+            return {"error": str(e)}
+    
+    async def test_connection(self):
+        """Test the API connection and key validity, probing all endpoints at once"""
+        try:
+            probes = await asyncio.gather(*(self._probe(endpoint) for endpoint in self.PROBE_ENDPOINTS))
+            return dict(zip(self.PROBE_ENDPOINTS, probes)), None
+        except Exception as e:
+            return None, str(e)
+    
+    async def get_enboxes(self, limit=None, offset=None, cursor=None):
+        """Fetch all Enboxes, or one page of them when limit/offset/cursor are given"""
+        return await self._request("GET", self._enbox_url(), params=self._enbox_list_params(limit, offset, cursor))
+    
+    async def create_enbox(self, email, password=None, display_name=None, create_via="direct"):
+        """Create a new Enbox - either direct (with password) or invite (without password)"""
+        payload, error = self._create_enbox_payload(email, password, display_name, create_via)
+        if error:
+            return None, error
+        
+        result, error = await self._request("POST", self._enbox_url(), json=payload)
+        if error is None:
+            self.enbox_cache.invalidate(self.api_key)
+        return result, error
+    
+    async def get_enbox(self, enbox_id):
+        """Get specific Enbox details"""
+        return await self._request("GET", self._enbox_url(enbox_id))
+    
+    async def activate_enbox(self, enbox_id, update_cache=True):
+        """Activate an Enbox; bulk callers pass update_cache=False and reconcile the cache once"""
+        result, error = await self._request("POST", self._enbox_url(enbox_id, "activate"), idempotent=True)
+        if error is None and update_cache:
+            self.enbox_cache.patch(self.api_key, enbox_id, is_active=True)
+        return result, error
+    
+    async def deactivate_enbox(self, enbox_id, update_cache=True):
+        """Deactivate an Enbox; bulk callers pass update_cache=False and reconcile the cache once"""
+        result, error = await self._request("POST", self._enbox_url(enbox_id, "deactivate"), idempotent=True)
+        if error is None and update_cache:
+            self.enbox_cache.patch(self.api_key, enbox_id, is_active=False)
+        return result, error
+    
+    async def get_stats(self):
+        """Get MSP dashboard statistics"""
+        result, error = await self._request("GET", self._url("/stats"))
+        if error is None:
+            self.rate_limiter.update_from_stats(result.get('rate_limit'))
+        return result, error
+    
+    async def get_usage(self):
+        """Get API usage statistics"""
+        return await self._request("GET", self._url("/usage"))
+    
+    async def send_email(self, to, subject, body):
+        """Send an email via the API Gateway"""
+        try:
+            response = await self._send(
+                "POST",
+                self._email_url(),
+                email=True,
+                json=self._email_payload(to, subject, body),
+                timeout=30
+            )
+            
+            if response.status_code == 401:
+                return None, f"Authentication failed. Please check your email API key. Response: {response.text}"
+            
+            response.raise_for_status()
+            return response.json(), None
+        except (httpx.HTTPError, RateLimitExceeded, CircuitOpenError) as e:
+            error_detail = f"{type(e).__name__}: {str(e)}"
+            if isinstance(e, httpx.HTTPStatusError):
+                error_detail += f" | Response: {e.response.text}"
+            return None, error_detail
+
+def build_enbox_dataframe(enboxes):
+    """
+    Build a DataFrame of Enbox records column by column, one column per
+    record field. created_via is categorical, is_active is bool and
+    created_at is datetime64 (UTC), so sorting, filtering and counting stay
+    vectorized. Missing fields are None.
+    """
+    import pandas as pd  # Deferred so only callers that build tables pay for the import
+    records = enboxes if isinstance(enboxes, list) else list(enboxes)
+    
+    return pd.DataFrame({
+        "id": [e.get("id") for e in records],
+        "enbox_rsync_id": [e.get("enbox_rsync_id") for e in records],
+        "display_name": [e.get("display_name") for e in records],
+        "created_via": pd.Categorical([e.get("created_via") for e in records]),
+        "is_active": np.fromiter((bool(e.get("is_active", True)) for e in records), dtype=bool, count=len(records)),
+        "created_at": pd.to_datetime(
+            [e.get("created_at") for e in records], format="ISO8601", utc=True, errors="coerce"
+        ),
+    })
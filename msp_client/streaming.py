@@ -0,0 +1,192 @@
+"""
+Incremental parsing of large /enboxes responses.
+
+A full listing for a large tenant is tens of megabytes. response.json()
+holds the body as bytes and again as decoded text while it builds every
+record. JSONArrayStream parses records from the body as chunks arrive, so
+only about one chunk of raw text is in memory at a time. Each chunk's
+complete records are decoded in a single json.loads call, which keeps the C
+decoder's speed and lets the records of a batch share their key strings.
+"""
+import codecs
+import json
+import re
+
+STREAM_CHUNK_SIZE = 256 * 1024  # Bytes read from the socket per step
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_SEPARATOR = re.compile(r"[ \t\n\r]*,")
+_NUMBER_CONTINUATION = frozenset("0123456789.eE+-")
+
+class JSONArrayStream:
+    """
+    Parse {"<array_key>": [record, ...], ...} (or a bare [record, ...]) from byte chunks.
+    
+    Iterating yields the array's records in order, and batches() yields them
+    as lists, one per decode. The object's other top-level fields are
+    collected in .fields as the parser passes them, so all of them are
+    available once iteration ends. Raises json.JSONDecodeError on malformed or
+    truncated input.
+    """
+    
+    def __init__(self, chunks, array_key="enboxes"):
+        self.array_key = array_key
+        self.fields = {}
+        self.is_list = False        # The body was a bare array
+        self.found_array = False    # The object had array_key holding an array
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder("utf-8-sig")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+    
+    def _fill(self):
+        """Append the next chunk to the buffer, dropping what was already parsed; False at end of input"""
+        if self._eof:
+            return False
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += self._text.decode(chunk)
+                return True
+        self._buffer += self._text.decode(b"", final=True)
+        self._eof = True
+        return False
+    
+    def _peek(self):
+        """Next non-whitespace character, reading more input as needed ("" at end of input)"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+    
+    def _decode(self):
+        """Decode one whole value at the cursor, or None if more input is needed to be sure"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            return None
+        if not self._eof and isinstance(value, (int, float)) and not isinstance(value, bool):
+            # A chunk boundary may split a number ("1" | ".5"), so it needs the character after it
+            if end == len(self._buffer) or self._buffer[end] in _NUMBER_CONTINUATION:
+                return None
+        self._pos = end
+        return (value,)
+    
+    def _value(self):
+        self._peek()
+        while True:
+            decoded = self._decode()
+            if decoded is not None:
+                return decoded[0]
+            self._fill()
+    
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buffer, self._pos)
+        self._pos += 1
+    
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+    
+    def batches(self):
+        first = self._peek()
+        if first == "[":
+            self.is_list = True
+            self._pos += 1
+            yield from self._batches()
+        elif first == "{":
+            self._pos += 1
+            yield from self._object()
+        else:
+            self.fields = self._value()  # Scalar or null body; no records
+        if self._peek() != "":
+            raise json.JSONDecodeError("Extra data", self._buffer, self._pos)
+    
+    def _object(self):
+        # Cursor is just past the opening "{"
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", self._buffer, self._pos)
+            key = self._value()
+            self._expect(":")
+            if key == self.array_key and self._peek() == "[":
+                self._pos += 1
+                self.found_array = True
+                yield from self._batches()
+            else:
+                self.fields[key] = self._value()
+            
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", self._buffer, self._pos - 1)
+    
+    def _last_record_end(self):
+        """Index just past the last "}," after the cursor, or -1"""
+        end = len(self._buffer)
+        while True:
+            brace = self._buffer.rfind("}", self._pos, end)
+            if brace < 0:
+                return -1
+            separator = _SEPARATOR.match(self._buffer, brace + 1)
+            if separator:
+                return separator.end()
+            end = brace
+    
+    def _batches(self):
+        # Cursor is just past the opening "["; at the top of the loop it is at a record
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            # Fast path: every complete record up to the last "}," in one decode
+            end = self._last_record_end()
+            if end > 0:
+                try:
+                    batch = json.loads(f"[{self._buffer[self._pos:end - 1]}]")
+                except json.JSONDecodeError:
+                    batch = None  # The cut fell inside a string or a nested value
+                if batch is not None:
+                    self._pos = end
+                    yield batch
+                    continue
+            
+            # Slow path: one record, read across chunks as needed, then its separator
+            yield [self._value()]
+            char = self._peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char == "":
+                raise json.JSONDecodeError("Unterminated array", self._buffer, self._pos - 1)
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", self._buffer, self._pos - 1)
+    
+def load_enbox_response(response, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Parse a streamed /enboxes response into the same shape response.json()
+    returns, reading the body in chunks instead of holding it whole.
+    """
+    stream = JSONArrayStream(response.iter_content(chunk_size), "enboxes")
+    records = []
+    for batch in stream.batches():
+        records.extend(batch)
+    if stream.is_list:
+        return records
+    if stream.found_array:
+        return {"enboxes": records, **stream.fields}
+    return stream.fields
@@ -1,19 +1,49 @@
 import streamlit as st
-import requests
-import json
+import threading
+import logging
+import time
+import os
+import sqlite3
+import string
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import pandas as pd
-
-# Page configuration
-st.set_page_config(
-    page_title="MSP API Manager",
-    page_icon="📦",
-    layout="wide",
-    initial_sidebar_state="expanded"
+import numpy as np
+
+from msp_client.client import (
+    BASE_URL as DEFAULT_BASE_URL,
+    EMAIL_BASE_URL as DEFAULT_EMAIL_BASE_URL,
+    POOL_MAXSIZE,
+    ENBOX_CACHE_TTL,
+    ENBOX_CACHE_MAX_ENTRIES,
+    METRICS_DUMP_INTERVAL,
+    DATA_DIR,
+    MSPAPIClient,
+    AsyncMSPAPIClient,
+    EnboxCollection,
+    api_key_fingerprint,
+    build_enbox_dataframe,
+    configure_logging,
+    env_number,
+    get_metrics,
+    log_event,
+    run_async,
+    start_metrics_exporters,
+)
+from msp_client.bulk import (
+    BULK_MAX_WORKERS,
+    BULK_RETRY_BACKOFF,
+    bulk_create_enboxes,
+    bulk_set_enbox_status,
+    invite_details,
+    is_transient_error,
+    parse_bulk_upload,
+    rate_limit_budget,
+    run_rate_aware,
 )
 
-# Custom CSS for better styling
-st.markdown("""
+# Styling injected on every rerun by setup_page()
+APP_CSS = """
     <style>
     .main-header {
         font-size: 2.5rem;
@@ -52,204 +82,367 @@ st.markdown("""
         color: #0c5460;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+# API Configuration, read on every script run so MSP_BASE_URL / MSP_EMAIL_BASE_URL
+# apply even when msp_client was imported earlier in this process
+BASE_URL = os.environ.get("MSP_BASE_URL", DEFAULT_BASE_URL)
+EMAIL_BASE_URL = os.environ.get("MSP_EMAIL_BASE_URL", DEFAULT_EMAIL_BASE_URL)
+
+configure_logging()
+
+# Background refresh
+REFRESH_INTERVAL = env_number("MSP_REFRESH_INTERVAL", 30, int)  # Seconds between refreshes per API key; 0 disables
+REFRESH_IDLE_TIMEOUT = 600      # Seconds without a rerun before a key stops being refreshed
+SUMMARY_CACHE_TTL = max(REFRESH_INTERVAL, 15)  # Seconds a stats+usage summary is shared; spans a refresh interval
+
+# Local persistence
+CAMPAIGN_DB_PATH = os.path.join(DATA_DIR, "campaigns.sqlite3")
+CAMPAIGN_MAX_ATTEMPTS = 3       # Sends per message before it is marked failed
+USAGE_DB_PATH = os.path.join(DATA_DIR, "usage.sqlite3")
+USAGE_HISTORY_ENABLED = os.environ.get("MSP_USAGE_HISTORY", "1") != "0"
+USAGE_SAMPLE_INTERVAL = 300     # Seconds between stored stats/usage samples per API key
+USAGE_RETENTION = (             # (resolution, seconds kept) per tier: raw, then hourly, then daily averages
+    (0, 2 * 86400),
+    (3600, 30 * 86400),
+    (86400, 400 * 86400),
+)
+USAGE_COMPACT_INTERVAL = 3600   # Seconds between downsampling passes
+
+# Enbox fields available to campaign templates as $name or ${name}
+TEMPLATE_FIELDS = ["display_name", "enbox_rsync_id", "id", "created_via", "created_at"]
 
-# API Configuration
-BASE_URL = "https://vwhxcuylitpawxjplfnq.supabase.co/functions/v1/msp-gateway"
-EMAIL_BASE_URL = "https://vwhxcuylitpawxjplfnq.supabase.co/functions/v1/api-gateway"
+def render_template(template, enbox):
+    """Fill $field placeholders from an Enbox; unknown placeholders are left as written"""
+    variables = {field: "" for field in TEMPLATE_FIELDS}
+    variables.update({k: "" if v is None else str(v) for k, v in enbox.items()})
+    return string.Template(template).safe_substitute(variables)
 
-class MSPAPIClient:
-    """Client for MSP API operations"""
+class CampaignQueue:
+    """
+    Durable SQLite send queue for email campaigns.
     
-    def __init__(self, api_key, email_api_key=None):
-        self.api_key = api_key
-        self.email_api_key = email_api_key
-        self.headers = {
-            "Content-Type": "application/json",
-            "x-msp-api-key": api_key
-        }
-        self.email_headers = {
-            "Content-Type": "application/json",
-            "x-api-key": email_api_key if email_api_key else api_key
-        }
+    Messages are rendered when queued and move pending -> sending -> sent/failed.
+    Messages left in "sending" by a process that stopped mid-run are returned to
+    pending when the queue is opened, so delivery is at-least-once.
+    """
     
-    def test_connection(self):
-        """Test the API connection and key validity"""
-        try:
-            # Try multiple possible endpoints
-            endpoints_to_test = [
-                "/enboxes",
-                "/stats", 
-                "/usage"
-            ]
-            
-            results = {}
-            for endpoint in endpoints_to_test:
-                url = f"{BASE_URL}{endpoint}"
-                print(f"\nDEBUG: Testing endpoint: {url}")
-                
-                try:
-                    response = requests.get(url, headers=self.headers, timeout=10)
-                    results[endpoint] = {
-                        "status": response.status_code,
-                        "text": response.text[:200],
-                        "headers": dict(response.headers)
-                    }
-                    print(f"  Status: {response.status_code}")
-                    print(f"  Response: {response.text[:200]}")
-                except Exception as e:
-                    results[endpoint] = {"error": str(e)}
-                    print(f"  Error: {e}")
-            
-            return results, None
-        except Exception as e:
-            return None, str(e)
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS campaigns (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            api_key_fingerprint TEXT NOT NULL,
+            subject_template TEXT NOT NULL,
+            body_template TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            campaign_id INTEGER NOT NULL REFERENCES campaigns(id),
+            enbox_id TEXT,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            sent_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS messages_campaign_status ON messages (campaign_id, status);
+    """
     
-    def get_enboxes(self):
-        """Fetch all Enboxes"""
-        try:
-            url = f"{BASE_URL}/enboxes"
-            print(f"DEBUG: Making request to: {url}")
-            print(f"DEBUG: Headers: {self.headers}")
-            
-            response = requests.get(url, headers=self.headers)
-            
-            print(f"DEBUG: Response Status: {response.status_code}")
-            print(f"DEBUG: Response Headers: {dict(response.headers)}")
-            print(f"DEBUG: Response Text: {response.text[:500]}")
-            
-            response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
-            print(f"DEBUG: Exception: {type(e).__name__}: {str(e)}")
-            return None, str(e)
-    
-    def create_enbox(self, email, password=None, display_name=None, create_via="direct"):
-        """Create a new Enbox - either direct (with password) or invite (without password)"""
+    def __init__(self, path=CAMPAIGN_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            conn.execute("UPDATE messages SET status = 'pending' WHERE status = 'sending'")
+    
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
         try:
-            payload = {
-                "email": email,
-                "create_via": create_via
-            }
-            
-            if create_via == "direct":
-                if not password:
-                    return None, "Password is required for direct creation"
-                payload["password"] = password
-            
-            if display_name:
-                payload["display_name"] = display_name
-            
-            response = requests.post(
-                f"{BASE_URL}/enboxes",
-                headers=self.headers,
-                json=payload
+            yield conn
+        finally:
+            conn.close()
+    
+    def create_campaign(self, name, api_key, subject_template, body_template, enboxes):
+        """Render and queue one message per Enbox with an rsync id; returns the campaign id"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            campaign_id = conn.execute(
+                "INSERT INTO campaigns (name, api_key_fingerprint, subject_template, body_template, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (name, api_key_fingerprint(api_key), subject_template, body_template, datetime.now().isoformat())
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO messages (campaign_id, enbox_id, recipient, subject, body) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (campaign_id, e.get("id"), e["enbox_rsync_id"],
+                     render_template(subject_template, e), render_template(body_template, e))
+                    for e in enboxes if e.get("enbox_rsync_id")
+                )
             )
-            response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
-            return None, str(e)
+            conn.execute("COMMIT")
+        return campaign_id
     
-    def get_enbox(self, enbox_id):
-        """Get specific Enbox details"""
-        try:
-            response = requests.get(
-                f"{BASE_URL}/enboxes/{enbox_id}",
-                headers=self.headers
+    def claim(self, campaign_id):
+        """Atomically move a campaign's pending messages to sending and return them"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, recipient, subject, body, attempts FROM messages "
+                "WHERE campaign_id = ? AND status = 'pending' ORDER BY id",
+                (campaign_id,)
+            ).fetchall()
+            conn.executemany("UPDATE messages SET status = 'sending' WHERE id = ?", ((r["id"],) for r in rows))
+            conn.execute("COMMIT")
+        return [dict(r) for r in rows]
+    
+    def release(self, message_ids):
+        """Return claimed but unsent messages to pending"""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE messages SET status = 'pending' WHERE id = ? AND status = 'sending'",
+                ((message_id,) for message_id in message_ids)
             )
-            response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
-            return None, str(e)
     
-    def activate_enbox(self, enbox_id):
-        """Activate an Enbox"""
-        try:
-            response = requests.post(
-                f"{BASE_URL}/enboxes/{enbox_id}/activate",
-                headers=self.headers
+    def mark_sent(self, message_id):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE messages SET status = 'sent', attempts = attempts + 1, error = NULL, sent_at = ? WHERE id = ?",
+                (time.time(), message_id)
             )
-            response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
-            return None, str(e)
     
-    def deactivate_enbox(self, enbox_id):
-        """Deactivate an Enbox"""
-        try:
-            response = requests.post(
-                f"{BASE_URL}/enboxes/{enbox_id}/deactivate",
-                headers=self.headers
+    def mark_failed(self, message_id, error, retry):
+        """Record a failed send; retryable messages go back to pending"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE messages SET status = ?, attempts = attempts + 1, error = ? WHERE id = ?",
+                ("pending" if retry else "failed", error, message_id)
             )
-            response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
-            return None, str(e)
     
-    def get_stats(self):
-        """Get MSP dashboard statistics"""
-        try:
-            response = requests.get(
-                f"{BASE_URL}/stats",
-                headers=self.headers
+    def retry_failed(self, campaign_id):
+        """Queue a campaign's failed messages again with a fresh attempt count"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE messages SET status = 'pending', attempts = 0 WHERE campaign_id = ? AND status = 'failed'",
+                (campaign_id,)
             )
-            response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
-            return None, str(e)
     
-    def get_usage(self):
-        """Get API usage statistics"""
+    def list_campaigns(self, api_key):
+        """Campaigns for an API key, newest first, with per-status counts and send throughput"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT c.id, c.name, c.created_at,
+                       COUNT(m.id) AS total,
+                       SUM(m.status IN ('pending', 'sending')) AS pending,
+                       SUM(m.status = 'sent') AS sent,
+                       SUM(m.status = 'failed') AS failed,
+                       MIN(m.sent_at) AS first_sent_at,
+                       MAX(m.sent_at) AS last_sent_at
+                FROM campaigns c LEFT JOIN messages m ON m.campaign_id = c.id
+                WHERE c.api_key_fingerprint = ?
+                GROUP BY c.id ORDER BY c.id DESC
+                """,
+                (api_key_fingerprint(api_key),)
+            ).fetchall()
+        
+        campaigns = []
+        for row in rows:
+            campaign = dict(row)
+            elapsed = (campaign["last_sent_at"] or 0) - (campaign["first_sent_at"] or 0)
+            campaign["per_second"] = round(campaign["sent"] / elapsed, 2) if elapsed > 0 else None
+            campaigns.append(campaign)
+        return campaigns
+
+@st.cache_resource
+def get_campaign_queue():
+    """Campaign queue shared by every session; opening it recovers interrupted sends"""
+    return CampaignQueue()
+
+class UsageHistory:
+    """
+    Local SQLite time series of /stats and /usage samples per API key.
+    
+    Each sample stores one row per metric (Enbox counts, 24h request totals,
+    and one row per action and status code). Rows are written at full
+    resolution, then compact() folds them into hourly and later daily
+    averages and drops anything past USAGE_RETENTION, so a key sampled every
+    five minutes stays at a few tens of thousands of rows.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS samples (
+            api_key_fingerprint TEXT NOT NULL,
+            resolution INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            ts REAL NOT NULL,
+            value REAL NOT NULL,
+            samples INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (api_key_fingerprint, resolution, metric, ts)
+        ) WITHOUT ROWID;
+    """
+    
+    def __init__(self, path=USAGE_DB_PATH, sample_interval=USAGE_SAMPLE_INTERVAL, retention=USAGE_RETENTION):
+        self.path = path
+        self.sample_interval = sample_interval
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._last_sample = {}  # fingerprint -> epoch of the last stored sample
+        self._compacted_at = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+    
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
         try:
-            response = requests.get(
-                f"{BASE_URL}/usage",
-                headers=self.headers
+            yield conn
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def flatten(stats_data, usage_data):
+        """{metric: value} for one /stats and /usage response pair"""
+        stats = stats_data.get("stats", {})
+        usage = usage_data.get("usage", {})
+        values = {name: stats.get(name) for name in
+                  ("total_enboxes", "active_enboxes", "inactive_enboxes", "api_calls_24h")}
+        values["rate_limit_remaining"] = stats_data.get("rate_limit", {}).get("remaining")
+        values["total_requests_24h"] = usage.get("total_requests_24h")
+        values.update((f"action:{k}", v) for k, v in usage.get("by_action", {}).items())
+        values.update((f"status:{k}", v) for k, v in usage.get("by_status", {}).items())
+        return {k: float(v) for k, v in values.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+    
+    def record(self, api_key, stats_data, usage_data, now=None):
+        """Store a sample unless this key was sampled within sample_interval; True if stored"""
+        now = time.time() if now is None else now
+        key = api_key_fingerprint(api_key)
+        with self._lock:
+            if now - self._last_sample.get(key, 0) < self.sample_interval:
+                return False
+            self._last_sample[key] = now
+            compact = now - self._compacted_at >= USAGE_COMPACT_INTERVAL
+            if compact:
+                self._compacted_at = now
+        
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO samples (api_key_fingerprint, resolution, metric, ts, value) "
+                "VALUES (?, 0, ?, ?, ?)",
+                ((key, metric, now, value) for metric, value in self.flatten(stats_data, usage_data).items())
             )
-            response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
-            return None, str(e)
+        if compact:
+            self.compact(now)
+        return True
+    
+    def compact(self, now=None):
+        """Fold rows older than each tier's retention into the next tier's buckets; drop the oldest"""
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for (resolution, kept), (coarser, _) in zip(self.retention, self.retention[1:]):
+                cutoff = now - kept
+                # Weighted averages, merged into buckets that earlier passes already started
+                conn.execute(
+                    """
+                    INSERT INTO samples (api_key_fingerprint, resolution, metric, ts, value, samples)
+                    SELECT api_key_fingerprint, ?, metric, CAST(ts / ? AS INTEGER) * ? AS bucket,
+                           SUM(value * samples) / SUM(samples), SUM(samples)
+                    FROM samples WHERE resolution = ? AND ts < ?
+                    GROUP BY api_key_fingerprint, metric, bucket
+                    ON CONFLICT (api_key_fingerprint, resolution, metric, ts) DO UPDATE SET
+                        value = (value * samples + excluded.value * excluded.samples) / (samples + excluded.samples),
+                        samples = samples + excluded.samples
+                    """,
+                    (coarser, coarser, coarser, resolution, cutoff)
+                )
+                conn.execute("DELETE FROM samples WHERE resolution = ? AND ts < ?", (resolution, cutoff))
+            resolution, kept = self.retention[-1]
+            conn.execute("DELETE FROM samples WHERE resolution = ? AND ts < ?", (resolution, now - kept))
+            conn.execute("COMMIT")
+    
+    def load(self, api_key, since):
+        """DataFrame of every stored row for an API key since an epoch: ts, metric, value"""
+        import pandas as pd
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT ts, metric, value FROM samples WHERE api_key_fingerprint = ? AND ts >= ? ORDER BY ts",
+                (api_key_fingerprint(api_key), since)
+            ).fetchall()
+        return pd.DataFrame(rows, columns=["ts", "metric", "value"])
     
-    def send_email(self, to, subject, body):
-        """Send an email via the API Gateway"""
+    def trends(self, api_key, days):
+        """
+        Wide DataFrame of metric averages over the last days, one row per
+        time bucket (hourly up to three days, daily beyond) and one column
+        per metric. The index is naive UTC, so daily buckets line up with
+        the UTC days compact() stores.
+        """
+        import pandas as pd
+        frame = self.load(api_key, time.time() - days * 86400)
+        if frame.empty:
+            return frame
+        frame["ts"] = pd.to_datetime(frame["ts"], unit="s", utc=True).dt.tz_convert(None)
+        wide = frame.pivot_table(index="ts", columns="metric", values="value", aggfunc="mean")
+        return wide.resample("1h" if days <= 3 else "1D").mean().dropna(how="all")
+
+@st.cache_resource
+def get_usage_history():
+    """Usage history shared by every session, or None when disabled"""
+    if not USAGE_HISTORY_ENABLED:
+        return None
+    return UsageHistory()
+
+def drain_campaign(client, queue, campaign_id, max_workers=BULK_MAX_WORKERS, budget=None):
+    """
+    Send a campaign's pending messages, yielding (message, status, error) as each
+    send completes; status is "sent", "retry" or "failed". Transient failures are
+    requeued and retried in another round until CAMPAIGN_MAX_ATTEMPTS is reached.
+    Messages not sent when the run stops (budget, 429, or the page being left)
+    are released, so a later drain resumes where this one stopped.
+    """
+    def send(message):
+        return client.send_email(to=message["recipient"], subject=message["subject"], body=message["body"])
+    
+    while True:
+        messages = queue.claim(campaign_id)
+        if not messages:
+            return
+        
+        finished = set()
+        retried = stopped = False
         try:
-            url = f"{EMAIL_BASE_URL}/emails"
-            payload = {
-                "to": to,
-                "subject": subject,
-                "body": body
-            }
-            
-            print(f"\n=== EMAIL SEND DEBUG ===")
-            print(f"URL: {url}")
-            print(f"Headers: {self.email_headers}")
-            print(f"Payload: {payload}")
-            print(f"API Key (first 12 chars): {self.email_api_key[:12] if self.email_api_key else 'MISSING'}")
-            
-            response = requests.post(
-                url,
-                headers=self.email_headers,
-                json=payload,
-                timeout=30
-            )
-            
-            print(f"Response Status: {response.status_code}")
-            print(f"Response Headers: {dict(response.headers)}")
-            print(f"Response Text: {response.text}")
-            print(f"======================\n")
-            
-            if response.status_code == 401:
-                error_msg = f"Authentication failed. Please check your email API key. Response: {response.text}"
-                return None, error_msg
-            
-            response.raise_for_status()
-            return response.json(), None
-        except requests.exceptions.RequestException as e:
-            error_detail = f"{type(e).__name__}: {str(e)}"
-            if hasattr(e, 'response') and e.response is not None:
-                error_detail += f" | Response: {e.response.text}"
-            print(f"DEBUG: Email Exception: {error_detail}")
-            return None, error_detail
+            for message, outcome, _ in run_rate_aware(send, messages, max_workers, budget):
+                if outcome is None:
+                    stopped = True
+                    continue
+                if budget is not None:
+                    budget -= 1
+                
+                _, error = outcome
+                if error is None:
+                    queue.mark_sent(message["id"])
+                    status = "sent"
+                else:
+                    retry = is_transient_error(error) and message["attempts"] + 1 < CAMPAIGN_MAX_ATTEMPTS
+                    queue.mark_failed(message["id"], error, retry)
+                    status = "retry" if retry else "failed"
+                    retried = retried or retry
+                finished.add(message["id"])
+                yield message, status, error
+        finally:
+            queue.release([m["id"] for m in messages if m["id"] not in finished])
+        
+        if stopped or not retried:
+            return
+        time.sleep(BULK_RETRY_BACKOFF)
 
 def init_session_state():
     """Initialize session state variables"""
@@ -259,10 +452,234 @@ def init_session_state():
         st.session_state.email_api_key = None
     if 'authenticated' not in st.session_state:
         st.session_state.authenticated = False
-    if 'enboxes_data' not in st.session_state:
-        st.session_state.enboxes_data = None
     if 'sent_emails' not in st.session_state:
         st.session_state.sent_emails = []
+    if 'bulk_create_results' not in st.session_state:
+        st.session_state.bulk_create_results = None
+    if 'bulk_status_results' not in st.session_state:
+        st.session_state.bulk_status_results = None
+
+def request_enbox_refresh():
+    """Make the next Enbox list read in this session bypass the shared cache"""
+    st.session_state.enboxes_refresh_requested = True
+
+def get_enbox_list(client, on_page=None):
+    """
+    Data-access layer for the Enbox list used by every page.
+    
+    Reads are served from the process-wide cache. A list past its TTL
+    (including the on-disk snapshot after a restart) is shown at once while it
+    revalidates in the background. A list invalidated by a write, or a refresh
+    requested with request_enbox_refresh(), waits for exactly one gateway
+    fetch on the next read.
+    on_page is forwarded to MSPAPIClient.list_enboxes for progressive rendering.
+    Returns (EnboxCollection, error); the collection is empty on error.
+    """
+    force_refresh = st.session_state.pop('enboxes_refresh_requested', False)
+    enboxes, error = client.list_enboxes(force_refresh=force_refresh, on_page=on_page, stale_ok=True)
+    
+    if error:
+        return EnboxCollection([]), error
+    return enboxes, None
+
+class DashboardSummaryCache:
+    """
+    Stats and usage per API key, fetched together as one summary and shared by every session.
+    
+    Entries live for a short TTL. Callers that arrive while a fetch for the
+    same key is in flight wait for it and share its result instead of
+    calling the gateway again, forced refreshes included. Every read is
+    counted in the metrics registry by how it was served, and successful
+    fetches are sampled into the usage history.
+    """
+    
+    def __init__(self, ttl=SUMMARY_CACHE_TTL, metrics=None, history=None):
+        self.ttl = ttl
+        self.metrics = metrics
+        self.history = history
+        self._entries = {}      # fingerprint -> (expires_at, fetched_at, summary)
+        self._fetch_locks = {}
+        self._lock = threading.Lock()
+    
+    def _record(self, outcome):
+        if self.metrics is not None:
+            self.metrics.record_coalesced("summary", outcome)
+    
+    def get_or_fetch(self, api_key, fetch, force_refresh=False):
+        """
+        Return {"stats": (data, error), "usage": (data, error), "updated_at": epoch},
+        calling fetch() -> (stats, usage) on a miss or when force_refresh is set.
+        A summary with an error is shared with callers already waiting on it
+        but is not cached.
+        """
+        key = api_key_fingerprint(api_key)
+        requested_at = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not force_refresh and entry[0] > requested_at:
+                self._record("hit")
+                return entry[2]
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+        
+        with fetch_lock:
+            # A fetch that finished while we waited is as fresh as one we would start
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and entry[1] >= requested_at:
+                self._record("joined")
+                return entry[2]
+            
+            stats, usage = fetch()
+            self._record("fetched")
+            summary = {"stats": stats, "usage": usage, "updated_at": time.time()}
+            fetched_at = time.monotonic()
+            ok = stats[1] is None and usage[1] is None
+            with self._lock:
+                self._entries[key] = (fetched_at + (self.ttl if ok else 0), fetched_at, summary)
+            if ok and self.history is not None:
+                try:
+                    self.history.record(api_key, stats[0], usage[0])
+                except sqlite3.Error as e:
+                    log_event(logging.WARNING, "usage_history.record_failed", error=str(e))
+            return summary
+    
+    def discard(self, api_key):
+        """
+        Drop a key's cached summary. Its fetch lock is kept: a caller may hold
+        or be about to take it, and a new lock would let a second fetch run.
+        """
+        with self._lock:
+            self._entries.pop(api_key_fingerprint(api_key), None)
+
+@st.cache_resource
+def get_summary_cache():
+    """Stats and usage summaries shared by every session of this deployment"""
+    return DashboardSummaryCache(metrics=get_metrics(), history=get_usage_history())
+
+class RefreshScheduler:
+    """
+    Background thread that keeps each active API key's dashboard data warm.
+    
+    Sessions register their client with track() on every rerun. Every
+    interval the thread fetches stats and usage into the summary cache and,
+    once a key's Enbox list is cached, revalidates it in the background when
+    it goes stale, so pages read them without blocking. Keys with no rerun for
+    REFRESH_IDLE_TIMEOUT are dropped, so gateway load is one refresh per
+    interval per active key rather than one per rerun per user.
+    """
+    
+    def __init__(self, summaries, interval=REFRESH_INTERVAL, idle_timeout=REFRESH_IDLE_TIMEOUT):
+        self.summaries = summaries
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._clients = {}      # fingerprint -> (client, last seen)
+        self._wake = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="refresh")
+        self._thread = None
+    
+    def track(self, client):
+        """Mark a client's API key as in use; a newly tracked key is prefetched right away"""
+        if self.interval <= 0:
+            return
+        key = api_key_fingerprint(client.api_key)
+        with self._lock:
+            is_new = key not in self._clients
+            self._clients[key] = (client, time.monotonic())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+                self._thread.start()
+        if is_new:
+            self._wake.set()
+    
+    def _fetch_summary(self, client):
+        stats = self._pool.submit(client.get_stats)
+        usage = self._pool.submit(client.get_usage)
+        return stats.result(), usage.result()
+    
+    def refresh(self, client):
+        """
+        Refresh one key's stats and usage, and revalidate its Enbox list in
+        parallel. A key with no cached list is left to the page's paged
+        fetch, so the Dashboard can still render the first page early.
+        """
+        enboxes = None
+        if client.enbox_cache.has(client.api_key):
+            enboxes = self._pool.submit(client.list_enboxes, stale_ok=True)
+        self.summaries.get_or_fetch(client.api_key, lambda: self._fetch_summary(client), force_refresh=True)
+        _, error = enboxes.result() if enboxes else (None, None)
+        if error:
+            log_event(logging.WARNING, "refresh.enboxes_failed", error=error)
+    
+    def _run(self):
+        next_due = {}
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                for key, (client, last_seen) in list(self._clients.items()):
+                    if now - last_seen > self.idle_timeout:
+                        del self._clients[key]
+                        self.summaries.discard(client.api_key)
+                        next_due.pop(key, None)
+                due = [(key, client) for key, (client, _) in self._clients.items() if next_due.get(key, 0) <= now]
+            
+            for key, client in due:
+                next_due[key] = now + self.interval
+                try:
+                    self.refresh(client)
+                except Exception as e:
+                    log_event(logging.ERROR, "refresh.failed", error=f"{type(e).__name__}: {e}")
+            
+            wait_for = min(next_due.values(), default=now + self.interval) - time.monotonic()
+            self._wake.wait(timeout=min(max(wait_for, 0.1), self.interval))
+            self._wake.clear()
+
+@st.cache_resource
+def get_refresh_scheduler():
+    """Refresh scheduler shared by every session of this deployment"""
+    return RefreshScheduler(get_summary_cache())
+
+def get_stats_and_usage(async_client, force_refresh=False):
+    """
+    Stats and usage as ((data, error), (data, error), updated_at).
+    
+    Read from the shared summary cache, which the background refresh keeps
+    warm; on a miss or force_refresh both are fetched here at once.
+    """
+    summary = get_summary_cache().get_or_fetch(
+        async_client.api_key,
+        lambda: run_async(async_client.gather(async_client.get_stats(), async_client.get_usage())),
+        force_refresh,
+    )
+    return summary["stats"], summary["usage"], summary["updated_at"]
+
+def show_connection_diagnostics(async_client, key="diagnose"):
+    """Opt-in probe of every gateway endpoint, for troubleshooting"""
+    st.markdown("### 🔧 Diagnostics")
+    if st.button("🔍 Diagnose Connection", key=key):
+        with st.spinner("Probing gateway endpoints..."):
+            test_results, test_error = run_async(async_client.test_connection())
+        
+        if test_error:
+            st.error(f"Connection test failed: {test_error}")
+        else:
+            st.json(test_results)
+
+@st.cache_resource(max_entries=ENBOX_CACHE_MAX_ENTRIES)
+def get_clients(api_key, email_api_key, base_url, email_base_url):
+    """Sync and async API clients for a key pair, built once per process and shared by sessions"""
+    endpoints = {"base_url": base_url, "email_base_url": email_base_url}
+    return MSPAPIClient(api_key, email_api_key, **endpoints), AsyncMSPAPIClient(api_key, email_api_key, **endpoints)
+
+def setup_page():
+    """Page config and CSS; Streamlit needs both on every rerun"""
+    st.set_page_config(
+        page_title="MSP API Manager",
+        page_icon="📦",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(APP_CSS, unsafe_allow_html=True)
 
 def authenticate():
     """Handle API key authentication from Streamlit secrets only"""
@@ -280,22 +697,10 @@ def authenticate():
             st.warning("⚠️ Email API Key not found in secrets. Email sending may not work.")
         st.info(f"Base URL: {BASE_URL}")
         
-        # Test the connection first
-        st.markdown("### 🔍 Testing Connection...")
-        
-        client = MSPAPIClient(api_key, email_api_key)
-        
-        with st.expander("🔧 Debug: Connection Test Results", expanded=True):
-            test_results, test_error = client.test_connection()
-            
-            if test_error:
-                st.error(f"Connection test failed: {test_error}")
-            else:
-                st.json(test_results)
+        client, async_client = get_clients(api_key, email_api_key, BASE_URL, EMAIL_BASE_URL)
         
-        # Try to authenticate with actual endpoint
-        st.markdown("### 🔐 Authenticating...")
-        data, error = client.get_enboxes()
+        with st.spinner("Authenticating..."):
+            _, error = client.validate_key()
         
         if error:
             st.markdown(f'<div class="error-box">❌ Authentication failed: {error}</div>', unsafe_allow_html=True)
@@ -307,7 +712,7 @@ def authenticate():
                 2. Check if the API key is valid and active<br>
                 3. Ensure the edge function name is correct: <code>msp-gateway</code><br>
                 4. Try accessing the URL directly in a browser or API client<br>
-                5. Check the debug information above for specific error details
+                5. Run the connection diagnostics below for per-endpoint details
                 </div>
             """, unsafe_allow_html=True)
             
@@ -317,6 +722,8 @@ def authenticate():
             st.code("https://plsyktpjiihgrnidisve.supabase.co/functions/v1/msp-gateway")
             st.code("https://plsyktpjiihgrnidisve.functions.supabase.co/msp-gateway/enboxes")
             
+            show_connection_diagnostics(async_client)
+            
         else:
             st.session_state.api_key = api_key
             st.session_state.email_api_key = email_api_key
@@ -340,6 +747,32 @@ def authenticate():
     except Exception as e:
         st.markdown(f'<div class="error-box">❌ Error loading secrets: {str(e)}</div>', unsafe_allow_html=True)
 
+# Dashboard table: build_enbox_dataframe columns shown, in order, under these titles
+ENBOX_COLUMN_TITLES = {
+    "id": "ID",
+    "enbox_rsync_id": "Rsync ID",
+    "display_name": "Display Name",
+    "created_via": "Created Via",
+    "status": "Status",
+    "created_at": "Created At",
+}
+STATUS_LABELS = ["🟢 Active", "🔴 Inactive"]
+
+def show_enbox_table(df):
+    """Render a build_enbox_dataframe table with dashboard titles and a status label"""
+    import pandas as pd
+    status = pd.Categorical.from_codes((~df["is_active"].to_numpy()).astype(np.int8), categories=STATUS_LABELS)
+    st.dataframe(
+        df.assign(status=status),
+        use_container_width=True,
+        hide_index=True,
+        column_order=list(ENBOX_COLUMN_TITLES),
+        column_config={
+            **ENBOX_COLUMN_TITLES,
+            "created_at": st.column_config.DatetimeColumn(ENBOX_COLUMN_TITLES["created_at"], format="YYYY-MM-DD"),
+        }
+    )
+
 def display_enboxes_list(client):
     """Display list of all Enboxes"""
     st.markdown('<div class="section-header">📦 Enboxes</div>', unsafe_allow_html=True)
@@ -348,85 +781,158 @@ def display_enboxes_list(client):
     
     with col3:
         if st.button("🔄 Refresh", use_container_width=True):
-            st.session_state.enboxes_data = None
+            request_enbox_refresh()
     
-    # Fetch enboxes
-    if st.session_state.enboxes_data is None:
-        with st.spinner("Loading Enboxes..."):
-            data, error = client.get_enboxes()
-            
-            if error:
-                st.markdown(f'<div class="error-box">❌ Error loading Enboxes: {error}</div>', unsafe_allow_html=True)
-                return
-            
-            st.session_state.enboxes_data = data
+    # Fetch enboxes page by page; the first page is shown while the rest load
+    preview = st.empty()
+    first_page = []
     
-    data = st.session_state.enboxes_data
+    def show_loading_progress(page, loaded, total):
+        if not first_page:
+            first_page.append(build_enbox_dataframe(page["enboxes"]))
+        with preview.container():
+            if total:
+                st.progress(min(loaded / total, 1.0), text=f"Loaded {loaded} of {total} Enboxes...")
+            else:
+                st.caption(f"Loaded {loaded} Enboxes...")
+            show_enbox_table(first_page[0])
+    
+    with st.spinner("Loading Enboxes..."):
+        enboxes, error = get_enbox_list(client, on_page=show_loading_progress)
+    preview.empty()
     
-    # Extract enboxes array from response
-    enboxes = data.get('enboxes', []) if isinstance(data, dict) else data
-    count = data.get('count', len(enboxes)) if isinstance(data, dict) else len(enboxes)
+    if error:
+        st.markdown(f'<div class="error-box">❌ Error loading Enboxes: {error}</div>', unsafe_allow_html=True)
+        return
     
-    if not enboxes or len(enboxes) == 0:
+    if not enboxes:
         st.info("No Enboxes found. Create your first one below!")
         return
     
+    count = enboxes.count
+    
+    fetched_at = (enboxes.sync or {}).get("fetched_at")
+    if fetched_at and time.time() - fetched_at > ENBOX_CACHE_TTL:
+        saved = datetime.fromtimestamp(fetched_at).strftime('%Y-%m-%d %H:%M:%S')
+        st.caption(f"🕒 Showing the Enbox list from {saved}; an update is loading in the background.")
+    
+    # Typed DataFrame, built once per fetch
+    df = enboxes.dataframe
+    
     # Display stats
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Total Enboxes", count)
     with col2:
-        active_count = sum(1 for e in enboxes if e.get("is_active", True))
+        active_count = int(df["is_active"].sum())
         st.metric("Active", active_count)
     with col3:
         inactive_count = count - active_count
         st.metric("Inactive", inactive_count)
     
-    # Convert to DataFrame for better display
-    df_data = []
-    for enbox in enboxes:
-        df_data.append({
-            "ID": enbox.get("id", "N/A"),
-            "Rsync ID": enbox.get("enbox_rsync_id", "N/A"),
-            "Display Name": enbox.get("display_name", "N/A"),
-            "Created Via": enbox.get("created_via", "N/A"),
-            "Status": "🟢 Active" if enbox.get("is_active", True) else "🔴 Inactive",
-            "Created At": enbox.get("created_at", "N/A")[:10] if enbox.get("created_at") else "N/A"
-        })
-    
-    df = pd.DataFrame(df_data)
-    
     # Search functionality
-    search_term = st.text_input("🔍 Search Enboxes", placeholder="Search by ID, name, or rsync ID...")
+    search_term = st.text_input(
+        "🔍 Search Enboxes",
+        placeholder="Search by ID, name, or rsync ID...",
+        help="Matches literal text. Scope a term with name:, rsync:, id: or via:, e.g. name:acme rsync:abc"
+    )
     
     if search_term:
-        mask = df.astype(str).apply(lambda x: x.str.contains(search_term, case=False, na=False)).any(axis=1)
-        df = df[mask]
+        df = df[enboxes.search_index.match(search_term)]
     
     # Display table
-    st.dataframe(
-        df,
-        use_container_width=True,
-        hide_index=True
-    )
+    show_enbox_table(df)
     
     # Detailed view
     with st.expander("📋 View Detailed JSON"):
         selected_id = st.selectbox(
             "Select Enbox to view details",
-            options=[enbox.get("id") for enbox in enboxes],
-            format_func=lambda x: f"{x} - {next((e.get('display_name', 'N/A') for e in enboxes if e.get('id') == x), 'N/A')}"
+            options=enboxes.ids(),
+            format_func=lambda x: f"{x} - {enboxes.get(x, {}).get('display_name', 'N/A')}"
         )
         
         if selected_id:
-            selected_enbox = next((e for e in enboxes if e.get("id") == selected_id), None)
+            selected_enbox = enboxes.get(selected_id)
             if selected_enbox:
                 st.json(selected_enbox)
 
+def bulk_create_form(client):
+    """Create many Enboxes from a CSV or JSONL upload"""
+    import pandas as pd
+    st.info("💡 Upload a CSV or JSONL file with `email`, `display_name`, `create_via` and `password` columns. "
+            "Rows without a password are created as invites.")
+    
+    uploaded = st.file_uploader("Enbox list", type=["csv", "jsonl", "ndjson"])
+    max_workers = st.slider("Parallel requests", min_value=1, max_value=POOL_MAXSIZE, value=BULK_MAX_WORKERS)
+    
+    if uploaded is not None:
+        rows, error = parse_bulk_upload(uploaded.name, uploaded.getvalue().decode("utf-8-sig"))
+        
+        if error:
+            st.markdown(f'<div class="error-box">❌ {error}</div>', unsafe_allow_html=True)
+            return
+        
+        st.caption(f"{len(rows)} rows loaded")
+        with st.expander("📋 Preview"):
+            st.dataframe(
+                pd.DataFrame(rows, columns=["email", "display_name", "create_via"]),
+                use_container_width=True,
+                hide_index=True
+            )
+        
+        if rows and st.button(f"🚀 Create {len(rows)} Enboxes", type="primary", use_container_width=True):
+            budget = rate_limit_budget(client)
+            if budget is not None and budget < len(rows):
+                st.warning(f"⚠️ Only {budget} requests left in the current rate limit window. "
+                           "Remaining rows will be skipped; re-upload them after the reset.")
+            
+            progress = st.progress(0.0, text="Starting...")
+            results = []
+            counts = {"created": 0, "failed": 0, "invalid": 0, "skipped": 0}
+            for result in bulk_create_enboxes(client, rows, max_workers=max_workers, budget=budget):
+                results.append(result)
+                counts[result["status"]] += 1
+                progress.progress(
+                    len(results) / len(rows),
+                    text=f"{len(results)}/{len(rows)} processed · {counts['created']} created · "
+                         f"{counts['failed'] + counts['invalid']} failed · {counts['skipped']} skipped"
+                )
+            
+            st.session_state.bulk_create_results = sorted(results, key=lambda r: r["row"])
+    
+    results = st.session_state.bulk_create_results
+    if results:
+        st.markdown("### 📊 Results")
+        results_df = pd.DataFrame(results)
+        status_counts = results_df["status"].value_counts()
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Created", int(status_counts.get("created", 0)))
+        with col2:
+            st.metric("Failed", int(status_counts.get("failed", 0)))
+        with col3:
+            st.metric("Invalid", int(status_counts.get("invalid", 0)))
+        with col4:
+            st.metric("Skipped", int(status_counts.get("skipped", 0)))
+        
+        st.dataframe(results_df, use_container_width=True, hide_index=True)
+        st.download_button(
+            "📥 Download Results CSV",
+            data=results_df.to_csv(index=False),
+            file_name=f"enbox_bulk_create_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+
 def create_enbox_form(client):
     """Form to create a new Enbox"""
     st.markdown('<div class="section-header">➕ Create New Enbox</div>', unsafe_allow_html=True)
     
+    mode = st.radio("Mode", options=["Single Enbox", "Bulk Upload"], horizontal=True)
+    if mode == "Bulk Upload":
+        bulk_create_form(client)
+        return
+    
     # Choose creation method
     create_method = st.radio(
         "Creation Method",
@@ -493,16 +999,9 @@ def create_enbox_form(client):
                         # Show different info based on creation method
                         if create_method == "invite":
                             st.markdown("### 📧 Invite Details")
-                            invite_link = result.get('invite_link', '')
-                            invite_token = result.get('invite_token', 'N/A')
+                            invite_path, invite_token = invite_details(result)
                             expires_at = result.get('invite_expires_at', 'N/A')
                             
-                            # Extract just the path if full URL is provided
-                            if invite_link and '/invite/' in invite_link:
-                                invite_path = '/invite/' + invite_link.split('/invite/')[-1]
-                            else:
-                                invite_path = f'/invite/{invite_token}' if invite_token != 'N/A' else 'N/A'
-                            
                             st.code(invite_path, language=None)
                             st.caption(f"Invite Token: {invite_token}")
                             st.caption(f"Expires: {expires_at[:10] if expires_at != 'N/A' else 'N/A'}")
@@ -511,9 +1010,122 @@ def create_enbox_form(client):
                         with st.expander("📋 Full Response"):
                             st.json(result)
                         
-                        st.session_state.enboxes_data = None  # Clear cache to refresh list
                         st.balloons()
 
+def run_campaign_drain(client, queue, campaign_id, max_workers):
+    """Drain a campaign with a live progress bar and throughput readout"""
+    pending = next((c["pending"] for c in queue.list_campaigns(client.api_key) if c["id"] == campaign_id), 0)
+    if not pending:
+        st.info("Nothing left to send for this campaign.")
+        return
+    
+    budget = rate_limit_budget(client)
+    progress = st.progress(0.0, text="Starting...")
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    started = time.monotonic()
+    for _, status, _ in drain_campaign(client, queue, campaign_id, max_workers=max_workers, budget=budget):
+        counts[status] += 1
+        done = counts["sent"] + counts["failed"]
+        rate = counts["sent"] / max(time.monotonic() - started, 1e-6)
+        progress.progress(
+            min(done / pending, 1.0),
+            text=f"{done}/{pending} done · {counts['sent']} sent · {counts['failed']} failed · "
+                 f"{counts['retry']} retries · {rate:.1f} emails/s"
+        )
+    
+    remaining = pending - counts["sent"] - counts["failed"]
+    if remaining > 0:
+        st.warning(f"⚠️ {remaining} messages are still queued (rate limit reached). Resume the campaign later.")
+    else:
+        st.markdown(f'<div class="success-box">✅ Campaign finished: {counts["sent"]} sent, {counts["failed"]} failed</div>',
+                    unsafe_allow_html=True)
+
+def campaign_form(client):
+    """Queue a templated email to many Enboxes and send it through the durable queue"""
+    import pandas as pd
+    queue = get_campaign_queue()
+    
+    enboxes, error = get_enbox_list(client)
+    if error:
+        st.markdown(f'<div class="error-box">❌ Error loading Enboxes: {error}</div>', unsafe_allow_html=True)
+        return
+    
+    st.markdown("### 📣 New Campaign")
+    audience = st.radio(
+        "Recipients",
+        options=["active", "all", "filter"],
+        format_func=lambda x: {"active": "All active Enboxes", "all": "All Enboxes", "filter": "Enboxes matching a filter"}[x],
+        horizontal=True
+    )
+    if audience == "filter":
+        query = st.text_input("Filter", placeholder="e.g. name:acme or via:invite", help="Same syntax as the Dashboard search")
+        mask = enboxes.search_index.match(query) if query else np.ones(len(enboxes), dtype=bool)
+        recipients = [e for e, hit in zip(enboxes, mask) if hit]
+    elif audience == "active":
+        recipients = [e for e in enboxes if e.get("is_active", True)]
+    else:
+        recipients = list(enboxes)
+    recipients = [e for e in recipients if e.get("enbox_rsync_id")]
+    st.caption(f"{len(recipients)} recipients")
+    
+    with st.form("campaign_form"):
+        name = st.text_input("Campaign Name *", placeholder="e.g. March maintenance notice")
+        subject = st.text_input("Subject *", placeholder="Hello $display_name")
+        body = st.text_area(
+            "Body *",
+            height=200,
+            placeholder="Hi $display_name,\n\nYour mailbox $enbox_rsync_id ...",
+            help="Placeholders: " + ", ".join(f"${field}" for field in TEMPLATE_FIELDS)
+        )
+        max_workers = st.slider("Parallel sends", min_value=1, max_value=POOL_MAXSIZE, value=BULK_MAX_WORKERS)
+        submitted = st.form_submit_button("📤 Queue & Send", type="primary", use_container_width=True)
+    
+    if recipients and (subject or body):
+        with st.expander("👀 Preview for first recipient"):
+            st.markdown(f"**To:** `{recipients[0]['enbox_rsync_id']}`")
+            st.markdown(f"**Subject:** {render_template(subject, recipients[0])}")
+            st.text(render_template(body, recipients[0]))
+    
+    if submitted:
+        if not name or not subject or not body:
+            st.markdown('<div class="error-box">❌ Name, subject and body are required</div>', unsafe_allow_html=True)
+        elif not recipients:
+            st.markdown('<div class="error-box">❌ No recipients selected</div>', unsafe_allow_html=True)
+        else:
+            campaign_id = queue.create_campaign(name, client.api_key, subject, body, recipients)
+            run_campaign_drain(client, queue, campaign_id, max_workers)
+    
+    campaigns = queue.list_campaigns(client.api_key)
+    if campaigns:
+        st.markdown("---")
+        st.markdown("### 📨 Campaigns")
+        st.dataframe(
+            pd.DataFrame(campaigns, columns=["id", "name", "created_at", "total", "sent", "failed", "pending", "per_second"]),
+            use_container_width=True,
+            hide_index=True,
+            column_config={"per_second": st.column_config.NumberColumn("Emails/s")}
+        )
+        
+        resumable = [c for c in campaigns if c["pending"] or c["failed"]]
+        if resumable:
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                campaign_id = st.selectbox(
+                    "Campaign",
+                    options=[c["id"] for c in resumable],
+                    format_func=lambda x: next(f"#{c['id']} {c['name']} ({c['pending']} pending, {c['failed']} failed)"
+                                               for c in resumable if c["id"] == x)
+                )
+            with col2:
+                resume = st.button("▶️ Resume", use_container_width=True)
+            with col3:
+                retry = st.button("🔁 Retry Failed", use_container_width=True)
+            
+            if retry:
+                queue.retry_failed(campaign_id)
+            if resume or retry:
+                run_campaign_drain(client, queue, campaign_id, BULK_MAX_WORKERS)
+
 def send_email_form(client):
     """Form to send emails"""
     st.markdown('<div class="section-header">📧 Send Email</div>', unsafe_allow_html=True)
@@ -539,25 +1151,41 @@ def send_email_form(client):
         st.caption("The edge function will validate this key against the api_keys table.")
         st.caption("Required permissions: 'write' or 'send'")
     
+    mode = st.radio("Mode", options=["Single Email", "Campaign"], horizontal=True)
+    if mode == "Campaign":
+        campaign_form(client)
+        return
+    
     # Option to select from existing Enboxes
-    data, error = client.get_enboxes()
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        use_enbox = st.checkbox("📦 Select recipient from existing Enboxes", value=True)
+    with col2:
+        if use_enbox and st.button("🔄 Refresh Enboxes", use_container_width=True):
+            request_enbox_refresh()
     
-    use_enbox = st.checkbox("📦 Select recipient from existing Enboxes", value=True)
+    enboxes, error = EnboxCollection([]), None
+    if use_enbox:
+        enboxes, error = get_enbox_list(client)
     
     with st.form("send_email_form"):
-        if use_enbox and data and not error:
-            enboxes = data.get('enboxes', []) if isinstance(data, dict) else data
-            
-            if enboxes and len(enboxes) > 0:
+        if use_enbox and not error:
+            if enboxes:
+                def format_recipient(enbox_id):
+                    if enbox_id == "":
+                        return "-- Select an Enbox --"
+                    enbox = enboxes.get(enbox_id, {})
+                    return f"{enbox.get('display_name', 'N/A')} ({enbox.get('enbox_rsync_id', 'N/A')})"
+                
                 selected_enbox_id = st.selectbox(
                     "Select Enbox Recipient *",
-                    options=[""] + [enbox.get("id") for enbox in enboxes],
-                    format_func=lambda x: "-- Select an Enbox --" if x == "" else f"{next((e.get('display_name', 'N/A') for e in enboxes if e.get('id') == x), 'N/A')} ({next((e.get('enbox_rsync_id', 'N/A') for e in enboxes if e.get('id') == x), 'N/A')})"
+                    options=[""] + enboxes.ids(),
+                    format_func=format_recipient
                 )
                 
                 # Get the rsync_id for the selected enbox
                 if selected_enbox_id:
-                    selected_enbox = next((e for e in enboxes if e.get("id") == selected_enbox_id), None)
+                    selected_enbox = enboxes.get(selected_enbox_id)
                     to_email = selected_enbox.get("enbox_rsync_id", "") if selected_enbox else ""
                     if to_email:
                         st.info(f"📬 Email will be sent to: `{to_email}`")
@@ -628,7 +1256,7 @@ def send_email_form(client):
                         
                         # Show debug info
                         with st.expander("🔧 Debug Information"):
-                            st.write("**Endpoint:**", f"{EMAIL_BASE_URL}/emails")
+                            st.write("**Endpoint:**", f"{client.email_base_url}/emails")
                             st.write("**API Key Prefix:**", st.session_state.email_api_key[:8] if st.session_state.email_api_key else "N/A")
                             st.write("**Recipient:**", to_email)
                             st.write("**Full Error:**", error)
@@ -665,19 +1293,22 @@ def send_email_form(client):
                 st.markdown(f"**Sent:** {email['timestamp']}")
                 st.json(email['response'])
 
-def display_statistics(client):
+def display_statistics(async_client):
     """Display MSP statistics and usage"""
+    import pandas as pd
     st.markdown('<div class="section-header">📊 Statistics & Usage</div>', unsafe_allow_html=True)
     
     col1, col2 = st.columns([3, 1])
     with col2:
-        if st.button("🔄 Refresh Stats", use_container_width=True):
-            pass  # Will refresh on rerun
+        force_refresh = st.button("🔄 Refresh Stats", use_container_width=True)
     
-    # Fetch stats
+    # Shared summary kept warm by the background refresh; only fetched here when missing or forced
     with st.spinner("Loading statistics..."):
-        stats_data, stats_error = client.get_stats()
-        usage_data, usage_error = client.get_usage()
+        (stats_data, stats_error), (usage_data, usage_error), updated_at = get_stats_and_usage(
+            async_client, force_refresh
+        )
+    with col1:
+        st.caption(f"Updated {datetime.fromtimestamp(updated_at).strftime('%H:%M:%S')}")
     
     if stats_error:
         st.markdown(f'<div class="error-box">❌ Error loading stats: {stats_error}</div>', unsafe_allow_html=True)
@@ -747,38 +1378,258 @@ def display_statistics(client):
         
         # Total requests
         st.metric("Total Requests (24h)", usage_stats.get('total_requests_24h', 0))
+    
+    display_usage_trends(async_client.api_key)
+
+TREND_RANGES = {"Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last year": 365}
+
+def display_usage_trends(api_key):
+    """Multi-day charts from the local usage history; no gateway calls"""
+    history = get_usage_history()
+    if history is None:
+        return
+    st.markdown("---")
+    st.markdown("### 📉 Trends")
+    
+    label = st.selectbox("Range", list(TREND_RANGES), index=1, key="trend_range")
+    trends = history.trends(api_key, TREND_RANGES[label])
+    if len(trends) < 2:
+        st.info(f"Trends appear once a few samples are stored (one every {USAGE_SAMPLE_INTERVAL // 60} minutes while the app is open).")
+        return
+    st.caption("Times are in UTC.")
+    
+    col1, col2 = st.columns(2)
+    if "total_enboxes" in trends:
+        # Least-squares slope over the range, for capacity planning
+        series = trends["total_enboxes"].dropna()
+        elapsed_days = (series.index - series.index[0]).total_seconds().to_numpy() / 86400
+        per_day = float(np.polyfit(elapsed_days, series.to_numpy(), 1)[0]) if len(series) > 1 else 0.0
+        with col1:
+            st.metric("Enbox Growth", f"{per_day:+.1f} / day")
+    if "total_requests_24h" in trends:
+        with col2:
+            st.metric("Peak Requests (24h)", f"{trends['total_requests_24h'].max():,.0f}")
+    
+    counts = [c for c in ("total_enboxes", "active_enboxes", "inactive_enboxes") if c in trends]
+    if counts:
+        st.markdown("#### Enboxes")
+        st.line_chart(trends[counts])
+    
+    status_columns = sorted(c for c in trends if c.startswith("status:"))
+    if status_columns:
+        st.markdown("#### Requests (24h) by Status Code")
+        st.area_chart(trends[status_columns].rename(columns=lambda c: c.split(":", 1)[1]))
+    elif "total_requests_24h" in trends:
+        st.markdown("#### Requests (24h)")
+        st.line_chart(trends[["total_requests_24h"]])
+
+def display_telemetry(client, async_client):
+    """Client-side latency percentiles per endpoint, next to the gateway's own usage counts"""
+    import pandas as pd
+    st.markdown('<div class="section-header">🛰️ Client Telemetry</div>', unsafe_allow_html=True)
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.caption("Measured by this app process for every gateway call, including retries.")
+    with col2:
+        # Process metrics are read fresh on every rerun; this also refetches the gateway's usage
+        force_refresh = st.button("🔄 Refresh", use_container_width=True)
+    
+    metrics = client.metrics
+    rows = metrics.summary()
+    _, (usage_data, usage_error), _ = get_stats_and_usage(async_client, force_refresh=force_refresh)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### This Process")
+        st.metric("Gateway Calls", sum(row["calls"] for row in rows))
+        st.caption(f"Since {datetime.fromtimestamp(metrics.started_at).strftime('%Y-%m-%d %H:%M:%S')}")
+    with col2:
+        st.markdown("#### Gateway (24h)")
+        if usage_error:
+            st.markdown(f'<div class="error-box">❌ Error loading usage: {usage_error}</div>', unsafe_allow_html=True)
+        else:
+            st.metric("Total Requests", usage_data.get('usage', {}).get('total_requests_24h', 0))
+    
+    st.markdown("---")
+    st.markdown("### ⏱️ Latency by Endpoint")
+    
+    if not rows:
+        st.info("No gateway calls recorded yet")
+    else:
+        latency_df = pd.DataFrame(rows).rename(columns={
+            "endpoint": "Endpoint",
+            "calls": "Calls",
+            "errors": "Errors",
+            "retries": "Retries",
+            "p50_ms": "p50 (ms)",
+            "p95_ms": "p95 (ms)",
+            "p99_ms": "p99 (ms)",
+            "mean_response_bytes": "Mean Response (B)",
+        })
+        st.dataframe(
+            latency_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "p50 (ms)": st.column_config.NumberColumn(format="%.1f"),
+                "p95 (ms)": st.column_config.NumberColumn(format="%.1f"),
+                "p99 (ms)": st.column_config.NumberColumn(format="%.1f"),
+                "Mean Response (B)": st.column_config.NumberColumn(format="%d"),
+            }
+        )
+    
+    st.markdown("### 🔗 Request Coalescing")
+    coalescing = metrics.coalescing("summary")
+    reads = sum(coalescing.values())
+    deduplicated = coalescing.get("hit", 0) + coalescing.get("joined", 0)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Summary Reads", reads)
+    with col2:
+        st.metric("Gateway Fetches", coalescing.get("fetched", 0))
+    with col3:
+        st.metric("Joined In-Flight", coalescing.get("joined", 0))
+    with col4:
+        st.metric("Deduplicated", f"{deduplicated / reads:.0%}" if reads else "—")
+    st.caption("Stats and usage reads across all sessions, served from the shared summary or a fetch already in flight.")
+    
+    if not usage_error:
+        by_action = usage_data.get('usage', {}).get('by_action', {})
+        if by_action:
+            st.markdown("#### Gateway Calls by Action (24h)")
+            action_df = pd.DataFrame([
+                {"Action": k, "Count": v} for k, v in by_action.items()
+            ]).sort_values('Count', ascending=False)
+            st.dataframe(action_df, use_container_width=True, hide_index=True)
+    
+    with st.expander("📤 Prometheus Export"):
+        text = metrics.render_prometheus()
+        st.caption(
+            "Set MSP_METRICS_PORT to serve this at /metrics, "
+            "or MSP_METRICS_FILE to write it to a file every "
+            f"{METRICS_DUMP_INTERVAL}s."
+        )
+        st.download_button("Download metrics.prom", text, file_name="metrics.prom", mime="text/plain")
+        st.code(text, language="text")
+    
+    st.markdown("---")
+    show_connection_diagnostics(async_client, key="telemetry_diagnose")
+
+def bulk_status_form(client, enboxes):
+    """Activate or deactivate many Enboxes at once"""
+    import pandas as pd
+    st.markdown("### Bulk Status Change")
+    
+    query = st.text_input(
+        "Filter Enboxes",
+        placeholder="e.g. name:acme or rsync:abc",
+        help="Same syntax as the Dashboard search",
+        key="bulk_status_filter"
+    )
+    if query:
+        mask = enboxes.search_index.match(query)
+        candidate_ids = [e.get("id") for e, hit in zip(enboxes, mask) if hit]
+    else:
+        candidate_ids = enboxes.ids()
+    
+    select_all = st.checkbox(f"Select all {len(candidate_ids)} matching Enboxes", key="bulk_status_all")
+    if select_all:
+        selected_ids = candidate_ids
+    else:
+        selected_ids = st.multiselect(
+            "Enboxes",
+            options=candidate_ids,
+            format_func=lambda x: f"{enboxes.get(x, {}).get('display_name', 'N/A')} ({x[:8]}...)",
+            key="bulk_status_ids"
+        )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        activate = st.radio(
+            "Action",
+            options=[False, True],
+            format_func=lambda x: "🟢 Activate" if x else "🔴 Deactivate",
+            horizontal=True,
+            key="bulk_status_action"
+        )
+    with col2:
+        max_workers = st.slider("Parallel requests", min_value=1, max_value=POOL_MAXSIZE,
+                                value=BULK_MAX_WORKERS, key="bulk_status_workers")
+    
+    skip_unchanged = st.checkbox(
+        "Skip Enboxes the list already shows in that state",
+        help=f"Uses the cached list, which can be up to {ENBOX_CACHE_TTL} seconds old; "
+             "Enboxes changed elsewhere since then may be left as they are",
+        key="bulk_status_skip_unchanged"
+    )
+    
+    action_label = "activate" if activate else "deactivate"
+    confirm = st.checkbox(f"I confirm I want to {action_label} {len(selected_ids)} Enboxes", key="bulk_status_confirm")
+    
+    if st.button(f"Apply to {len(selected_ids)} Enboxes", type="primary",
+                 disabled=not (selected_ids and confirm), use_container_width=True):
+        budget = rate_limit_budget(client)
+        progress = st.progress(0.0, text="Starting...")
+        results = []
+        for result in bulk_set_enbox_status(client, selected_ids, activate, max_workers=max_workers, budget=budget,
+                                            skip_unchanged=skip_unchanged):
+            results.append(result)
+            progress.progress(len(results) / len(selected_ids), text=f"{len(results)}/{len(selected_ids)} processed")
+        st.session_state.bulk_status_results = {"action": action_label, "results": results}
+    
+    summary = st.session_state.bulk_status_results
+    if summary:
+        results_df = pd.DataFrame(summary["results"])
+        status_counts = results_df["status"].value_counts()
+        
+        st.markdown(f"#### Last bulk {summary['action']}")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Updated", int(status_counts.get("updated", 0)))
+        with col2:
+            st.metric("Already in state", int(status_counts.get("unchanged", 0)))
+        with col3:
+            st.metric("Failed", int(status_counts.get("failed", 0)))
+        with col4:
+            st.metric("Skipped", int(status_counts.get("skipped", 0)))
+        
+        problems = results_df[results_df["status"].isin(["failed", "skipped"])]
+        if not problems.empty:
+            st.dataframe(problems, use_container_width=True, hide_index=True)
 
 def manage_enbox(client):
     """Manage individual Enbox"""
     st.markdown('<div class="section-header">⚙️ Manage Enbox</div>', unsafe_allow_html=True)
     
+    if st.button("🔄 Refresh Enboxes"):
+        request_enbox_refresh()
+    
     # Get list of enboxes for selection
-    data, error = client.get_enboxes()
+    enboxes, error = get_enbox_list(client)
     
-    if error or not data:
-        st.warning("No Enboxes available to manage. Create one first!")
+    if error:
+        st.markdown(f'<div class="error-box">❌ Error loading Enboxes: {error}</div>', unsafe_allow_html=True)
         return
     
-    enboxes = data.get('enboxes', []) if isinstance(data, dict) else data
-    
-    if not enboxes or len(enboxes) == 0:
+    if not enboxes:
         st.warning("No Enboxes available to manage. Create one first!")
         return
     
     selected_id = st.selectbox(
         "Select Enbox to manage",
-        options=[enbox.get("id") for enbox in enboxes],
-        format_func=lambda x: f"{next((e.get('display_name', 'N/A') for e in enboxes if e.get('id') == x), 'N/A')} ({x[:8]}...)"
+        options=enboxes.ids(),
+        format_func=lambda x: f"{enboxes.get(x, {}).get('display_name', 'N/A')} ({x[:8]}...)"
     )
     
     if not selected_id:
         return
     
     # Get selected enbox details
-    selected_enbox = next((e for e in enboxes if e.get("id") == selected_id), None)
+    selected_enbox = enboxes.get(selected_id)
     is_active = selected_enbox.get("is_active", True) if selected_enbox else True
     
-    tab1, tab2 = st.tabs(["📄 View Details", "⚙️ Activate/Deactivate"])
+    tab1, tab2, tab3 = st.tabs(["📄 View Details", "⚙️ Activate/Deactivate", "📦 Bulk Status"])
     
     with tab1:
         st.markdown("### Enbox Information")
@@ -844,7 +1695,6 @@ def manage_enbox(client):
                     else:
                         st.markdown('<div class="success-box">✅ Enbox activated successfully!</div>', unsafe_allow_html=True)
                         st.json(result)
-                        st.session_state.enboxes_data = None
                         st.rerun()
         
         with col2:
@@ -862,11 +1712,14 @@ def manage_enbox(client):
                         else:
                             st.markdown('<div class="success-box">✅ Enbox deactivated successfully!</div>', unsafe_allow_html=True)
                             st.json(result)
-                            st.session_state.enboxes_data = None
                             st.rerun()
+    
+    with tab3:
+        bulk_status_form(client, enboxes)
 
 def main():
     """Main application"""
+    setup_page()
     init_session_state()
     
     # Authentication check
@@ -883,14 +1736,13 @@ def main():
             st.session_state.authenticated = False
             st.session_state.api_key = None
             st.session_state.email_api_key = None
-            st.session_state.enboxes_data = None
             st.rerun()
         
         st.markdown("---")
         st.markdown("### 📚 Navigation")
         page = st.radio(
             "Select Page",
-            ["Dashboard", "Create Enbox", "Send Email", "Manage Enbox", "Statistics"],
+            ["Dashboard", "Create Enbox", "Send Email", "Manage Enbox", "Statistics", "Client Telemetry"],
             label_visibility="collapsed"
         )
         
@@ -899,8 +1751,13 @@ def main():
         st.caption("MSP API Manager v1.1")
         st.caption("Manage customer Enboxes & send emails")
     
-    # Initialize API client
-    client = MSPAPIClient(st.session_state.api_key, st.session_state.email_api_key)
+    start_metrics_exporters()
+    
+    # Shared API clients for this key pair, kept warm by the background refresh
+    client, async_client = get_clients(
+        st.session_state.api_key, st.session_state.email_api_key, BASE_URL, EMAIL_BASE_URL
+    )
+    get_refresh_scheduler().track(client)
     
     # Main content
     st.markdown('<div class="main-header">📦 MSP API Manager</div>', unsafe_allow_html=True)
@@ -914,7 +1771,9 @@ def main():
     elif page == "Manage Enbox":
         manage_enbox(client)
     elif page == "Statistics":
-        display_statistics(client)
+        display_statistics(async_client)
+    elif page == "Client Telemetry":
+        display_telemetry(client, async_client)
 
 if __name__ == "__main__":
     main()
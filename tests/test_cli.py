@@ -0,0 +1,12 @@
+import argparse
+
+import pytest
+
+from msp_client.cli import positive_int
+
+
+def test_positive_int_rejects_zero_negative_and_text():
+    assert positive_int("4") == 4
+    for value in ("0", "-3", "abc"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            positive_int(value)
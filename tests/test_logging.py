@@ -0,0 +1,35 @@
+import json
+import logging
+import queue
+import sys
+
+from msp_client.client import DroppingQueueHandler, JSONLogFormatter, RedactingFilter, log_level_name
+
+
+def emit(record_factory):
+    records = queue.Queue()
+    handler = DroppingQueueHandler(records)
+    handler.addFilter(RedactingFilter())
+    handler.handle(record_factory())
+    return json.loads(JSONLogFormatter().format(records.get_nowait()))
+
+
+def test_traceback_is_redacted_into_exc_field():
+    def record():
+        try:
+            raise RuntimeError("boom {'x-msp-api-key': 'msp_live_SECRET'}")
+        except RuntimeError:
+            return logging.getLogger("msp").makeRecord(
+                "msp", logging.ERROR, __file__, 1, "failed %s", ("password=hunter2",), exc_info=sys.exc_info()
+            )
+
+    entry = emit(record)
+
+    assert entry["event"] == "failed password=[REDACTED]"
+    assert "RuntimeError" in entry["exc"]
+    assert "SECRET" not in json.dumps(entry)
+
+
+def test_unknown_log_level_falls_back_to_warning():
+    assert log_level_name("debug") == "DEBUG"
+    assert log_level_name("verbose") == "WARNING"
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from msp_client.client import EnboxCollection, EnboxSnapshotStore
+
+RECORDS = [
+    {"id": "a", "display_name": None, "meta": {"p": 1}, "tags": [1, "x"], "score": 1, "active": True},
+    {"id": "b", "display_name": "B", "meta": {"q": 2}, "tags": [], "score": 2.5, "active": False},
+    {"id": "c", "meta": {"p": {"deep": [None]}}, "tags": None, "score": None, "extra": "ünï©ødé 🎉"},
+    {"id": "d", "display_name": "D", "meta": None, "score": 3, "counts": [1, 2]},
+]
+
+
+def test_snapshot_round_trips_records_exactly(tmp_path):
+    store = EnboxSnapshotStore(str(tmp_path))
+    sync = {"etag": '"v1"', "watermark": "2024-01-01T00:00:00+00:00", "fetched_at": 1.0}
+    store.save("key", EnboxCollection(RECORDS, 4, sync))
+
+    loaded = store.load("key")
+
+    assert loaded.enboxes == RECORDS
+    assert [type(r.get("score")) for r in loaded.enboxes] == [type(r.get("score")) for r in RECORDS]
+    assert [list(r) for r in loaded.enboxes] == [list(r) for r in RECORDS]
+    assert loaded.count == 4
+    assert loaded.sync == sync
+
+
+def test_sync_only_save_updates_sync_state(tmp_path):
+    store = EnboxSnapshotStore(str(tmp_path))
+    collection = EnboxCollection(RECORDS, 4, {"etag": '"v1"', "fetched_at": 1.0})
+    store.save("key", collection)
+
+    store.save_sync("key", collection.with_sync({"etag": '"v1"', "fetched_at": 2.0}))
+
+    assert store.load("key").sync == {"etag": '"v1"', "fetched_at": 2.0}
+
+
+def test_snapshot_for_another_key_is_ignored(tmp_path):
+    store = EnboxSnapshotStore(str(tmp_path))
+    store.save("key", EnboxCollection(RECORDS, 4, None))
+
+    assert store.load("other") is None
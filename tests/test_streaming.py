@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from msp_client.streaming import JSONArrayStream, load_enbox_response
+
+DOCUMENT = {
+    "count": 3,
+    "enboxes": [
+        {"id": "a", "score": 1.5, "size": 12345678901234, "name": "x},{\"y", "active": True},
+        {"id": "b", "score": -3.25e-2, "tags": [{"t": 1}, {"t": "}, {"}], "active": None},
+        {"id": "c", "score": 2e10, "name": "ünï©ødé 🎉", "nested": {}},
+    ],
+    "ratio": 0.75,
+    "next_cursor": None,
+}
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def parse(text, size):
+    stream = JSONArrayStream(chunks(text.encode(), size))
+    return list(stream), stream.fields
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        return iter(chunks(self.body, chunk_size))
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 16])
+def test_records_and_fields_match_json_loads(size):
+    records, fields = parse(json.dumps(DOCUMENT), size)
+    assert records == DOCUMENT["enboxes"]
+    assert fields == {k: v for k, v in DOCUMENT.items() if k != "enboxes"}
+
+
+@pytest.mark.parametrize("text", [
+    '{"enboxes":[{"d":3}],"z":1.5}',
+    '{"z":1e5,"enboxes":[]}',
+    '[1.5, 2e10, -3.25E-2, 7]',
+    '{"enboxes":[{"a":1},{"b":-0.5e+3}],"count":10}',
+])
+def test_numbers_split_at_every_chunk_boundary(text):
+    expected = json.loads(text)
+    data = text.encode()
+    for cut in range(1, len(data)):
+        stream = JSONArrayStream([data[:cut], data[cut:]])
+        records = list(stream)
+        if isinstance(expected, list):
+            assert records == expected, cut
+        else:
+            assert records == expected["enboxes"], cut
+            assert stream.fields == {k: v for k, v in expected.items() if k != "enboxes"}, cut
+
+
+@pytest.mark.parametrize("text", [
+    "[1 2]",
+    "[1,]",
+    "[,1]",
+    "[1.]",
+    '[{"a":1} {"b":2}]',
+    '{"enboxes":[{"a":1},]}',
+    '{"enboxes":[]} x',
+    '{"a":1,}',
+    "{1:2}",
+    '{"enboxes":[{"a":1}',
+    "",
+])
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_malformed_input_raises(text, size):
+    with pytest.raises(json.JSONDecodeError):
+        parse(text, size)
+
+
+def test_load_enbox_response_keeps_the_response_json_shape():
+    for document in (DOCUMENT, DOCUMENT["enboxes"], {"error": "Unauthorized"}):
+        body = json.dumps(document).encode()
+        assert load_enbox_response(FakeResponse(body), chunk_size=5) == document